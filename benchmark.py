@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# SCP-079-LANG - Ban or delete by detecting the language
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-LANG.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compare the memory usage of user_ids stored as nested dicts and as UserStatus
+# Usage: python3 benchmark.py [users ...], the default sizes are 100000 1000000 5000000
+
+import gc
+import sys
+import tracemalloc
+from copy import deepcopy
+from random import Random
+
+from plugins.functions.store import UserDict, UserStatus
+
+default_user_status = {
+    "detected": {},
+    "join": {},
+    "score": {
+        "captcha": 0.0,
+        "clean": 0.0,
+        "lang": 0.0,
+        "long": 0.0,
+        "noflood": 0.0,
+        "noporn": 0.0,
+        "nospam": 0.0,
+        "recheck": 0.0,
+        "warn": 0.0
+    }
+}
+
+
+def fill(user_ids: dict, total: int) -> dict:
+    # Fill the users like the production data, most of them only joined a group
+    random = Random(total)
+    groups = [-1001000000000 - i for i in range(1000)]
+    projects = list(default_user_status["score"])
+
+    for uid in range(100000000, 100000000 + total):
+        user_ids[uid] = deepcopy(default_user_status)
+        status = user_ids[uid]
+
+        for gid in random.sample(groups, random.choice([1, 1, 1, 1, 2, 3])):
+            status["join"][gid] = 1512345678 + random.randrange(2592000)
+
+        if random.random() < 0.1:
+            status["detected"][random.choice(groups)] = 1512345678 + random.randrange(2592000)
+
+        if random.random() < 0.05:
+            status["score"][random.choice(projects)] = round(random.random() * 2, 1)
+
+    return user_ids
+
+
+def measure(layout: str, total: int) -> int:
+    # Get the bytes allocated by the user_ids of the layout
+    gc.collect()
+    tracemalloc.start()
+
+    if layout == "dict":
+        user_ids = fill({}, total)
+    else:
+        user_ids = fill(UserDict(), total)
+
+    gc.collect()
+    result = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del user_ids
+
+    return result
+
+
+def main() -> bool:
+    UserStatus.projects = tuple(default_user_status["score"])
+    sizes = [int(size) for size in sys.argv[1:]] or [100000, 1000000, 5000000]
+
+    print(f"{'users':>10} {'dict':>12} {'slots':>12} {'dict/user':>10} {'slots/user':>11} {'saved':>7}")
+
+    for total in sizes:
+        old = measure("dict", total)
+        new = measure("slots", total)
+        print(f"{total:>10} {old / 2 ** 20:>10.1f}MB {new / 2 ** 20:>10.1f}MB "
+              f"{old / total:>9.0f}B {new / total:>10.0f}B {1 - new / old:>7.1%}")
+
+    return True
+
+
+if __name__ == "__main__":
+    main()
@@ -26,12 +26,18 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from pyrogram import Client
 
 from plugins import glovar
+from plugins.functions.etc import start_loop, start_workers
+from plugins.functions.file import save_data
 from plugins.functions.timers import backup_files, interval_min_10, interval_min_15, reset_data, send_count
 from plugins.functions.timers import update_admins, update_status
 
 # Enable logging
 logger = logging.getLogger(__name__)
 
+# Start the event loop and the worker pool of the background tasks
+start_loop()
+start_workers()
+
 # Config session
 app = Client(
     session_name="bot",
@@ -44,6 +50,7 @@ update_status(app, "online")
 
 # Timer
 scheduler = BackgroundScheduler(job_defaults={"misfire_grace_time": 60})
+scheduler.add_job(save_data, "interval", seconds=glovar.time_save)
 scheduler.add_job(interval_min_10, "interval", minutes=10)
 scheduler.add_job(interval_min_15, "interval", [app], minutes=15)
 scheduler.add_job(update_status, "cron", [app, "awake"], minute=randint(30, 34), second=randint(0, 59))
@@ -58,3 +65,7 @@ app.idle()
 
 # Stop
 app.stop()
+scheduler.shutdown()
+
+# Save the data
+save_data()
@@ -24,9 +24,9 @@ from pyrogram import Chat, Client, Message, User
 from pyrogram.errors import FloodWait
 
 from .. import glovar
-from .etc import code, code_block, general_link, get_forward_name, get_full_name, get_md5sum, get_text, lang
-from .etc import message_link, thread, wait_flood
-from .file import crypt_file, data_to_file, delete_file, get_new_path, save
+from .etc import code, code_block, general_link, get_context, get_forward_name, get_full_name, get_md5sum, get_text
+from .etc import delay, get_priority, lang, message_link, rate_limit, thread, wait_flood
+from .file import crypt_file, data_to_file, delete_file, get_new_path, journal
 from .telegram import get_group_info, send_document, send_message
 
 # Enable logging
@@ -111,8 +111,8 @@ def exchange_to_hide(client: Client) -> bool:
 
 
 def format_data(sender: str, receivers: List[str], action: str, action_type: str,
-                data: Union[bool, dict, int, str] = None) -> str:
-    # See https://scp-079.org/exchange/
+                data: Union[bool, dict, int, list, str] = None) -> str:
+    # See https://scp-079.org/exchange/, the JSON is compact
     text = ""
     try:
         data = {
@@ -122,7 +122,7 @@ def format_data(sender: str, receivers: List[str], action: str, action_type: str
             "type": action_type,
             "data": data
         }
-        text = code_block(dumps(data, indent=4))
+        text = code_block(dumps(data, ensure_ascii=False, separators=(",", ":")))
     except Exception as e:
         logger.warning(f"Format data error: {e}", exc_info=True)
 
@@ -199,6 +199,7 @@ def forward_evidence(client: Client, message: Message, user: User, level: str, r
         flood_wait = True
         while flood_wait:
             flood_wait = False
+            rate_limit(channel_id, get_priority(channel_id), "forward_messages")
             try:
                 result = message.forward(
                     chat_id=channel_id,
@@ -206,7 +207,7 @@ def forward_evidence(client: Client, message: Message, user: User, level: str, r
                 )
             except FloodWait as e:
                 flood_wait = True
-                wait_flood(e)
+                wait_flood(e, channel_id, "forward_messages")
             except Exception as e:
                 logger.warning(f"Forward evidence message error: {e}", exc_info=True)
                 return False
@@ -226,6 +227,11 @@ def get_content(message: Message) -> str:
         if not message:
             return ""
 
+        context = get_context(message)
+
+        if context is not None and "content" in context:
+            return context["content"]
+
         text = get_text(message)
 
         if message.audio:
@@ -239,6 +245,9 @@ def get_content(message: Message) -> str:
 
         if text:
             result += get_md5sum("string", text)
+
+        if context is not None:
+            context["content"] = result
     except Exception as e:
         logger.warning(f"Get content error: {e}", exc_info=True)
 
@@ -284,7 +293,7 @@ def send_debug(client: Client, chat: Chat, action: str, uid: int, mid: int, em:
         text += (f"{lang('user_id')}{lang('colon')}{code(uid)}\n"
                  f"{lang('action')}{lang('colon')}{code(action)}\n"
                  f"{lang('triggered_by')}{lang('colon')}{general_link(mid, message_link(em))}\n")
-        thread(send_message, (client, glovar.debug_channel_id, text))
+        thread(send_message, (client, glovar.debug_channel_id, text), "log")
 
         return True
     except Exception as e:
@@ -314,10 +323,51 @@ def share_bad_user(client: Client, uid: int) -> bool:
     return False
 
 
+def share_batch(client: Client) -> bool:
+    # Share the pending data in batches, each batch is an exchange message of the action "batch"
+    try:
+        with glovar.locks["share"]:
+            events = glovar.shares
+            glovar.shares = []
+
+        batch = []
+
+        for i, event in enumerate(events):
+            batch.append(event)
+
+            if i + 1 < len(events) and len(dumps(batch + [events[i + 1]])) <= glovar.shares_size:
+                continue
+
+            receivers = sorted({receiver for event in batch for receiver in event[0]})
+            share_data_thread(client, receivers, "batch", "v2", batch)
+            batch = []
+
+        return True
+    except Exception as e:
+        logger.warning(f"Share batch error: {e}", exc_info=True)
+
+    return False
+
+
 def share_data(client: Client, receivers: List[str], action: str, action_type: str,
                data: Union[bool, dict, int, str] = None, file: str = None, encrypt: bool = True) -> bool:
     # Use this function to share data in the channel
     try:
+        # Collect the text data for a short window, the files and the emergency requests are sent at once
+        if glovar.share_batch and not file and action != "batch" and "EMERGENCY" not in receivers:
+            receivers = [receiver for receiver in receivers if receiver != glovar.sender]
+
+            if not receivers:
+                return True
+
+            with glovar.locks["share"]:
+                pending = bool(glovar.shares)
+                glovar.shares.append([receivers, action, action_type, data])
+
+            not pending and delay(glovar.shares_window, share_batch, [client])
+
+            return True
+
         thread(
             target=share_data_thread,
             args=(client, receivers, action, action_type, data, file, encrypt)
@@ -397,17 +447,18 @@ def share_regex_count(client: Client, word_type: str) -> bool:
         if not glovar.regex.get(word_type):
             return True
 
-        if not eval(f"glovar.{word_type}_words"):
+        if not glovar.words.get(word_type):
             return True
 
-        file = data_to_file(eval(f"glovar.{word_type}_words"))
+        file = data_to_file(glovar.words[word_type], True)
         share_data(
             client=client,
             receivers=["REGEX"],
             action="regex",
             action_type="count",
             data=f"{word_type}_words",
-            file=file
+            file=file,
+            encrypt=False
         )
 
         return True
@@ -445,7 +496,7 @@ def update_score(client: Client, uid: int) -> bool:
         count = len(glovar.user_ids[uid]["detected"])
         score = count * 0.6
         glovar.user_ids[uid]["score"][glovar.sender.lower()] = score
-        save("user_ids")
+        journal("user_ids", "set", (uid, "score", glovar.sender.lower()), score)
         share_data(
             client=client,
             receivers=glovar.receivers["score"],
@@ -18,24 +18,27 @@
 
 import logging
 import re
+from bisect import bisect_right
 from datetime import datetime
 from hashlib import md5
 from html import escape
 from json import dumps
+from queue import PriorityQueue
 from random import choice, uniform
+from sre_constants import LITERAL, MAX_REPEAT, MIN_REPEAT, SUBPATTERN
+from sre_parse import parse
 from string import ascii_letters, digits, punctuation
-from threading import Thread, Timer
+from threading import Lock, Thread
 from time import localtime, sleep, strftime, time
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Set, Union
 from unicodedata import normalize
 
 from cryptography.fernet import Fernet
 from guess_language import guess_language
 from langdetect import detect
-from opencc import convert
+from langid import classify
 from pyrogram import InlineKeyboardMarkup, Message, MessageEntity, User
 from pyrogram.errors import FloodWait
-from textblob import TextBlob
 
 from .. import glovar
 
@@ -98,6 +101,85 @@ def code_block(text: Any) -> str:
     return ""
 
 
+def compile_regex(word_type: str) -> dict:
+    # Compile the regex rules of the word type, should be called while holding the regex lock
+    result = {
+        "all": [],
+        "ocr": [],
+        "index": None,
+        "prefixes": {},
+        "indexed": 0
+    }
+    try:
+        for word in list(glovar.words.get(word_type, {})):
+            try:
+                pattern = re.compile(word, re.I | re.S | re.M)
+            except re.error as e:
+                logger.warning(f"Compile regex {word} error: {e}")
+                continue
+
+            literal = get_regex_literal(word)
+            result["indexed"] += bool(literal)
+            result["all"].append((word, pattern, literal))
+
+            if "(?# nocr)" not in word:
+                result["ocr"].append((word, pattern, literal))
+
+        # Build the literal prefilter
+        literals = {literal for _, _, literal in result["all"] if literal}
+        result.update(get_regex_index(literals))
+
+        glovar.compiled[word_type] = result
+        glovar.scans.clear()
+    except Exception as e:
+        logger.warning(f"Compile regex error: {e}", exc_info=True)
+
+    return result
+
+
+def compile_special(special: str, words: dict) -> bool:
+    # Regenerate the special characters dictionary and the translate table, call under the regex lock
+    try:
+        special_dict = {}
+
+        for rule in words:
+            # Check keys
+            if "[" not in rule:
+                continue
+
+            # Check value
+            if "?#" not in rule:
+                continue
+
+            keys = rule.split("]")[0][1:]
+            value = rule.split("?#")[1][1]
+
+            for k in keys:
+                special_dict[k] = value
+
+        setattr(glovar, f"{special}_dict", special_dict)
+        special_table = {}
+
+        for k in set(glovar.spc_dict) | set(glovar.spe_dict):
+            value = glovar.spc_dict.get(k, k)
+            value = glovar.spe_dict.get(value, value)
+
+            if value != k:
+                special_table[ord(k)] = value
+
+        glovar.special_table = special_table
+
+        # The texts stored in the contexts are normalized by the old table
+        with glovar.locks["context"]:
+            glovar.contexts.clear()
+
+        return True
+    except Exception as e:
+        logger.warning(f"Compile special error: {e}", exc_info=True)
+
+    return False
+
+
 def crypt_str(operation: str, text: str, key: bytes) -> str:
     # Encrypt or decrypt a string
     result = ""
@@ -117,12 +199,10 @@ def crypt_str(operation: str, text: str, key: bytes) -> str:
     return result
 
 
-def delay(secs: int, target: Callable, args: list) -> bool:
-    # Call a function with delay
+def delay(secs: float, target: Callable, args: list, priority: str = "normal") -> bool:
+    # Call a function with delay, the timer is kept by the event loop instead of a sleeping thread
     try:
-        t = Timer(secs, target, args)
-        t.daemon = True
-        t.start()
+        glovar.loop.call_soon_threadsafe(glovar.loop.call_later, secs, thread, target, tuple(args), priority)
 
         return True
     except Exception as e:
@@ -204,6 +284,100 @@ def get_command_type(message: Message) -> str:
     return result
 
 
+def get_context(message: Message) -> Optional[dict]:
+    # Get the message's context, features of the message are computed once and stored in it
+    result = None
+    try:
+        if not message or not message.chat or not message.message_id:
+            return None
+
+        key = (message.chat.id, message.message_id, message.edit_date or 0)
+
+        with glovar.locks["context"]:
+            result = glovar.contexts.get(key)
+
+            if result is not None:
+                glovar.contexts.move_to_end(key)
+                return result
+
+            result = {}
+            glovar.contexts[key] = result
+
+            while len(glovar.contexts) > glovar.contexts_size:
+                glovar.contexts.popitem(last=False)
+    except Exception as e:
+        logger.warning(f"Get context error: {e}", exc_info=True)
+
+    return result
+
+
+def get_emoji_dict(text: str) -> Dict[str, int]:
+    # Get the count of each emoji in the text, scan once from left to right
+    result = {}
+
+    try:
+        i = 0
+
+        while i < len(text):
+            emoji = get_emoji_match(text, i)
+
+            if not emoji:
+                i += 1
+                continue
+
+            result[emoji] = result.get(emoji, 0) + 1
+            i += len(emoji)
+    except Exception as e:
+        logger.warning(f"Get emoji dict error: {e}", exc_info=True)
+
+    return result
+
+
+def get_emoji_match(text: str, i: int) -> str:
+    # Get the longest emoji sequence starting at the position
+    result = ""
+
+    try:
+        node = glovar.emoji_trie.get(text[i])
+
+        while node is not None:
+            result = node.get("", result)
+            i += 1
+
+            if i >= len(text):
+                break
+
+            node = node.get(text[i])
+    except Exception as e:
+        logger.warning(f"Get emoji match error: {e}", exc_info=True)
+
+    return result
+
+
+def get_emoji_stripped(text: str) -> str:
+    # Get the text without any emoji sequence
+    result = text
+
+    try:
+        chars = []
+        i = 0
+
+        while i < len(text):
+            emoji = get_emoji_match(text, i)
+
+            if emoji:
+                i += len(emoji)
+            else:
+                chars.append(text[i])
+                i += 1
+
+        result = "".join(chars)
+    except Exception as e:
+        logger.warning(f"Get emoji stripped error: {e}", exc_info=True)
+
+    return result
+
+
 def get_entity_text(message: Message, entity: MessageEntity) -> str:
     # Get a message's entity text
     result = ""
@@ -227,6 +401,12 @@ def get_filename(message: Message, normal: bool = False, printable: bool = False
     # Get file's filename
     text = ""
     try:
+        context = get_context(message)
+        key = f"filename {normal} {printable}"
+
+        if context is not None and key in context:
+            return context[key]
+
         if message.document:
             if message.document.file_name:
                 text += message.document.file_name
@@ -236,6 +416,9 @@ def get_filename(message: Message, normal: bool = False, printable: bool = False
 
         if text:
             text = t2t(text, normal, printable)
+
+        if context is not None:
+            context[key] = text
     except Exception as e:
         logger.warning(f"Get filename error: {e}", exc_info=True)
 
@@ -246,6 +429,12 @@ def get_forward_name(message: Message, normal: bool = False, printable: bool = F
     # Get forwarded message's origin sender's name
     text = ""
     try:
+        context = get_context(message)
+        key = f"forward {normal} {printable}"
+
+        if context is not None and key in context:
+            return context[key]
+
         if message.forward_from:
             user = message.forward_from
             text = get_full_name(user, normal, printable)
@@ -257,12 +446,35 @@ def get_forward_name(message: Message, normal: bool = False, printable: bool = F
 
         if text:
             text = t2t(text, normal, printable)
+
+        if context is not None:
+            context[key] = text
     except Exception as e:
         logger.warning(f"Get forward name error: {e}", exc_info=True)
 
     return text
 
 
+def get_from_name(message: Message, normal: bool = False, printable: bool = False) -> str:
+    # Get the message sender's full name
+    text = ""
+    try:
+        context = get_context(message)
+        key = f"name {normal} {printable}"
+
+        if context is not None and key in context:
+            return context[key]
+
+        text = get_full_name(message.from_user, normal, printable)
+
+        if context is not None:
+            context[key] = text
+    except Exception as e:
+        logger.warning(f"Get from name error: {e}", exc_info=True)
+
+    return text
+
+
 def get_full_name(user: User, normal: bool = False, printable: bool = False) -> str:
     # Get user's full name
     text = ""
@@ -296,16 +508,93 @@ def get_int(text: str) -> Optional[int]:
 
 
 def get_lang(text: str, flood: bool = False) -> str:
-    # Get text's language code
+    # Get text's language code, use the cache if possible
+    result = ""
+
+    try:
+        if not text or not text.strip():
+            return ""
+
+        if not glovar.lang_cache_size:
+            return get_lang_detect(text, flood)
+
+        key = get_md5sum("string", " ".join(text.split())) + (flood and "f" or "n")
+        cached = get_lang_cache(key)
+
+        if cached is not None:
+            return cached
+
+        result = get_lang_detect(text, flood)
+        set_lang_cache(key, result)
+    except Exception as e:
+        logger.warning(f"Get lang error: {e}", exc_info=True)
+
+    return result
+
+
+def get_lang_cache(key: str) -> Optional[str]:
+    # Get the cached language detection result
+    result = None
+
+    try:
+        now = get_now()
+
+        with glovar.locks["lang"]:
+            cached = glovar.lang_cache.get(key)
+
+            if cached and now - cached[0] < glovar.lang_cache_time:
+                glovar.lang_cache.move_to_end(key)
+                glovar.lang_cache_count["hit"] += 1
+                return cached[1]
+
+            if cached:
+                glovar.lang_cache.pop(key, None)
+
+            glovar.lang_cache_count["miss"] += 1
+    except Exception as e:
+        logger.warning(f"Get lang cache error: {e}", exc_info=True)
+
+    return result
+
+
+def get_lang_candidates(text: str) -> Optional[Set[str]]:
+    # Get the possible languages of the text by its scripts, None means undecidable
+    result = None
+
+    try:
+        scripts = get_scripts(text)
+
+        if not scripts or scripts.get(""):
+            return None
+
+        result = set()
+
+        for script in scripts:
+            result |= glovar.script_langs.get(script, set())
+    except Exception as e:
+        logger.warning(f"Get lang candidates error: {e}", exc_info=True)
+
+    return result
+
+
+def get_lang_detect(text: str, flood: bool = False) -> str:
+    # Get text's language code using the detectors
     result = ""
 
     try:
+        # Decide by the script if possible
+        candidates = get_lang_candidates(text)
+
+        if candidates is not None and len(candidates) == 1:
+            result = candidates.pop()
+            return (result not in glovar.lang_protect and result) or ""
+
         # Remove unnecessary strings
         chinese_symbols = "～！、，。？￥…×—·．：；“”‘’（）〈〉《》「」『』【】〔〕"
         english_symbols = punctuation
         special_symbols = "£"
         symbols = chinese_symbols + english_symbols + special_symbols
-        text = "".join(t for t in text if t not in symbols and t not in glovar.emoji_set)
+        text = "".join(t for t in get_emoji_stripped(text) if t not in symbols)
 
         # Avoid short name
         if len(text) < 20:
@@ -323,17 +612,19 @@ def get_lang(text: str, flood: bool = False) -> str:
         # Init
         recheck = ""
 
-        # Use langdetect, use textblob to recheck
+        # Use langdetect, use langid to recheck
         result = get_lang_langdetect(text)
 
         if result and not flood:
-            recheck = get_lang_textblob(text)
+            recheck = get_lang_recheck(text)
 
-        lang_default = glovar.lang_bio | glovar.lang_name | glovar.lang_sticker | glovar.lang_text
+        # The recheck model does not tell the variants of Chinese apart
+        if result and recheck and recheck == result.split("-")[0]:
+            recheck = result
 
         if result and flood:
             return result
-        if result and recheck and (result == recheck or recheck not in lang_default):
+        if result and recheck and (result == recheck or recheck not in glovar.lang_default):
             return recheck
         elif result:
             return ""
@@ -341,7 +632,7 @@ def get_lang(text: str, flood: bool = False) -> str:
         # Use guess
         result = get_lang_guess(text)
     except Exception as e:
-        logger.warning(f"Get lang error: {e}", exc_info=True)
+        logger.warning(f"Get lang detect error: {e}", exc_info=True)
 
     return result
 
@@ -376,18 +667,17 @@ def get_lang_langdetect(text: str) -> str:
     return result
 
 
-def get_lang_textblob(text: str) -> str:
-    # Get language using textblob
+def get_lang_recheck(text: str) -> str:
+    # Get language using langid, its n-gram model is shipped with the package and never touches the network
     result = ""
 
     try:
-        b = TextBlob(text)
-        result = b.detect_language()
+        result, _ = classify(text)
 
         if not result or result in glovar.lang_protect:
             return ""
     except Exception as e:
-        logger.info(f"Get lang textblob error: {e}", exc_info=True)
+        logger.info(f"Get lang recheck error: {e}", exc_info=True)
 
     return result
 
@@ -396,6 +686,11 @@ def get_links(message: Message) -> List[str]:
     # Get a message's links
     result = []
     try:
+        context = get_context(message)
+
+        if context is not None and "links" in context:
+            return context["links"]
+
         entities = message.entities or message.caption_entities
 
         if entities:
@@ -433,6 +728,9 @@ def get_links(message: Message) -> List[str]:
                         continue
 
                     result.append(url)
+
+        if context is not None:
+            context["links"] = result
     except Exception as e:
         logger.warning(f"Get links error: {e}", exc_info=True)
 
@@ -474,6 +772,46 @@ def get_now() -> int:
     return result
 
 
+def get_priority(cid: int) -> str:
+    # Get the priority of sending messages to the chat
+    result = "normal"
+    try:
+        if cid == glovar.debug_channel_id:
+            result = "log"
+    except Exception as e:
+        logger.warning(f"Get priority error: {e}", exc_info=True)
+
+    return result
+
+
+def get_rate_wait(cid: int = 0, priority: str = "normal", method: str = "") -> float:
+    # Take the tokens of an API call if it is allowed now, otherwise get the secs to wait
+    result = 0.0
+    try:
+        reserve = glovar.rate_reserves[priority]
+
+        with glovar.locks["rate"]:
+            now = time()
+            wait = glovar.flood_until.get((method, cid), 0.0) - now
+
+            if wait <= 0:
+                wait = take_token(0, "global", reserve, now)
+
+            # The enforcement calls are not limited by the per-chat bucket, which is for sending messages
+            if wait <= 0 and cid and priority != "enforce":
+                wait = take_token(cid, "chat", reserve, now)
+
+                # Give back the global token
+                if wait > 0:
+                    glovar.rate_buckets[0][0] += 1
+
+            result = max(wait, 0.0)
+    except Exception as e:
+        logger.warning(f"Get rate wait error: {e}", exc_info=True)
+
+    return result
+
+
 def get_readable_time(secs: int = 0, the_format: str = "%Y%m%d%H%M%S") -> str:
     # Get a readable time string
     result = ""
@@ -489,6 +827,101 @@ def get_readable_time(secs: int = 0, the_format: str = "%Y%m%d%H%M%S") -> str:
     return result
 
 
+def get_regex_index(literals: Set[str]) -> dict:
+    # Get the prefilter which finds all the literals in one scan, and the literals that each found one implies
+    result = {
+        "index": None,
+        "prefixes": {}
+    }
+    try:
+        if not literals:
+            return result
+
+        result["index"] = re.compile(f"(?=({get_regex_trie(literals)}))", re.I | re.S | re.M)
+        result["prefixes"] = {literal: {literal[:i] for i in range(2, len(literal) + 1) if literal[:i] in literals}
+                              for literal in literals}
+    except Exception as e:
+        logger.warning(f"Get regex index error: {e}", exc_info=True)
+
+    return result
+
+
+def get_regex_literal(word: str) -> str:
+    # Get the longest literal string that every match of the regex rule must contain
+    result = ""
+    try:
+        runs = []
+
+        def walk(tokens: list) -> None:
+            run = ""
+
+            for op, av in tokens:
+                if op is LITERAL:
+                    run += chr(av)
+                    continue
+
+                runs.append(run)
+                run = ""
+
+                # Only the groups and the repeats that must appear contain required literals
+                if op is SUBPATTERN:
+                    walk(av[-1])
+                elif op in {MAX_REPEAT, MIN_REPEAT} and av[0] >= 1:
+                    walk(av[2])
+
+            runs.append(run)
+
+        walk(parse(word, re.I | re.S | re.M))
+        result = max(runs, key=len)
+
+        # The case folding which changes the length can not be looked up, always run the rule
+        if len(result.lower()) != len(result):
+            return ""
+
+        result = result.lower()
+
+        if len(result) < 2:
+            return ""
+    except Exception as e:
+        logger.info(f"Get regex literal error: {e}", exc_info=True)
+
+    return result
+
+
+def get_regex_trie(literals: Set[str]) -> str:
+    # Get a regex that matches the longest literal at a position, built from the literals' trie
+    result = ""
+    try:
+        trie = {}
+
+        for literal in literals:
+            node = trie
+
+            for t in literal:
+                node = node.setdefault(t, {})
+
+            node[""] = {}
+
+        def emit(the_node: dict) -> str:
+            parts = [re.escape(k) + emit(v) for k, v in sorted(the_node.items()) if k]
+
+            if not parts:
+                return ""
+
+            body = parts[0] if len(parts) == 1 else "(?:" + "|".join(parts) + ")"
+
+            if "" in the_node:
+                body = f"(?:{body})?"
+
+            return body
+
+        result = emit(trie)
+    except Exception as e:
+        logger.warning(f"Get regex trie error: {e}", exc_info=True)
+
+    return result
+
+
 def get_report_record(message: Message) -> Dict[str, str]:
     # Get report message's full record
     record = {
@@ -562,6 +995,62 @@ def get_report_record(message: Message) -> Dict[str, str]:
     return record
 
 
+def get_scripts(text: str) -> Dict[str, int]:
+    # Get the letters count of each script in the text, "" for the unknown scripts
+    result = {}
+
+    try:
+        for t in text:
+            if not t.isalpha():
+                continue
+
+            point = ord(t)
+
+            if point < 0x80:
+                script = "latin"
+            else:
+                i = bisect_right(glovar.script_starts, point) - 1
+                script = ""
+
+                if i >= 0 and point <= glovar.script_ranges[i][1]:
+                    script = glovar.script_ranges[i][2]
+
+            result[script] = result.get(script, 0) + 1
+    except Exception as e:
+        logger.warning(f"Get scripts error: {e}", exc_info=True)
+
+    return result
+
+
+def get_simplified(text: str) -> str:
+    # Get the simplified Chinese text, use the cache if possible
+    result = text
+
+    try:
+        # Skip the text without any Han character
+        if not glovar.han.search(text):
+            return text
+
+        key = get_md5sum("string", text)
+
+        with glovar.locks["convert"]:
+            cached = glovar.convert_cache.get(key)
+
+            if cached is not None:
+                glovar.convert_cache.move_to_end(key)
+                return cached
+
+            result = glovar.converter.convert(text)
+            glovar.convert_cache[key] = result
+
+            while len(glovar.convert_cache) > glovar.convert_cache_size:
+                glovar.convert_cache.popitem(last=False)
+    except Exception as e:
+        logger.warning(f"Get simplified error: {e}", exc_info=True)
+
+    return result
+
+
 def get_stripped_link(link: str) -> str:
     # Get stripped link
     result = ""
@@ -589,6 +1078,12 @@ def get_text(message: Message, normal: bool = False, printable: bool = False) ->
         if not message:
             return ""
 
+        context = get_context(message)
+        key = f"text {normal} {printable}"
+
+        if context is not None and key in context:
+            return context[key]
+
         the_text = message.text or message.caption
 
         if the_text:
@@ -596,6 +1091,9 @@ def get_text(message: Message, normal: bool = False, printable: bool = False) ->
 
         if text:
             text = t2t(text, normal, printable)
+
+        if context is not None:
+            context[key] = text
     except Exception as e:
         logger.warning(f"Get text error: {e}", exc_info=True)
 
@@ -613,6 +1111,25 @@ def lang(text: str) -> str:
     return result
 
 
+def lock_chat(the_type: str, gid: int) -> Lock:
+    # Acquire the chat's lock, the chats are hashed into a fixed number of locks, the caller should release it
+    locks = glovar.chat_locks[the_type]
+    result = locks[gid % len(locks)]
+    start = time()
+    result.acquire()
+
+    try:
+        # The count is approximate, it is not worth another lock
+        wait = time() - start
+        glovar.lock_count["count"] += 1
+        glovar.lock_count["wait"] += wait
+        glovar.lock_count["max"] = max(glovar.lock_count["max"], wait)
+    except Exception as e:
+        logger.warning(f"Lock chat error: {e}", exc_info=True)
+
+    return result
+
+
 def mention_id(uid: int) -> str:
     # Get a ID mention string
     result = ""
@@ -647,6 +1164,76 @@ def random_str(i: int) -> str:
     return text
 
 
+def rate_limit(cid: int = 0, priority: str = "normal", method: str = "") -> bool:
+    # Wait until an API call is allowed by the flood backoff of the method in the chat and the token buckets
+    try:
+        while True:
+            wait = get_rate_wait(cid, priority, method)
+
+            if wait <= 0:
+                return True
+
+            sleep(wait)
+    except Exception as e:
+        logger.warning(f"Rate limit error: {e}", exc_info=True)
+
+    return False
+
+
+def set_lang_cache(key: str, result: str) -> bool:
+    # Save a language detection result to the cache
+    try:
+        with glovar.locks["lang"]:
+            glovar.lang_cache[key] = (get_now(), result)
+            glovar.lang_cache.move_to_end(key)
+
+            while len(glovar.lang_cache) > glovar.lang_cache_size:
+                glovar.lang_cache.popitem(last=False)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Set lang cache error: {e}", exc_info=True)
+
+    return False
+
+
+def start_loop() -> bool:
+    # Run the event loop of the background tasks in a thread
+    try:
+        if glovar.loop.is_running():
+            return True
+
+        t = Thread(target=glovar.loop.run_forever)
+        t.daemon = True
+        t.start()
+
+        return True
+    except Exception as e:
+        logger.warning(f"Start loop error: {e}", exc_info=True)
+
+    return False
+
+
+def start_workers() -> bool:
+    # Start the bounded worker pool of the tasks
+    try:
+        # The log sends wait for the per-chat bucket, so they must not hold the workers of the other tasks
+        workers = ([glovar.tasks] * glovar.task_workers
+                   + [glovar.tasks_enforce] * glovar.task_enforce_workers
+                   + [glovar.tasks_log] * glovar.task_log_workers)
+
+        for queue in workers:
+            t = Thread(target=work, args=(queue,))
+            t.daemon = True
+            t.start()
+
+        return True
+    except Exception as e:
+        logger.warning(f"Start workers error: {e}", exc_info=True)
+
+    return False
+
+
 def t2t(text: str, normal: bool, printable: bool, simplified: bool = False) -> str:
     # Convert the string, text to text
     try:
@@ -654,28 +1241,45 @@ def t2t(text: str, normal: bool, printable: bool, simplified: bool = False) -> s
             return ""
 
         if normal:
-            for special in ["spc", "spe"]:
-                text = "".join(eval(f"glovar.{special}_dict").get(t, t) for t in text)
-
-            text = normalize("NFKC", text)
+            text = normalize("NFKC", text.translate(glovar.special_table))
 
-        if printable:
-            text = "".join(t for t in text if t.isprintable() or t in {"\n", "\r", "\t"})
+        if printable and not text.isprintable():
+            text = glovar.unprintable.sub("", text)
 
         if (normal or simplified) and glovar.zh_cn:
-            text = convert(text, config="t2s.json")
+            text = get_simplified(text)
     except Exception as e:
         logger.warning(f"T2T error: {e}", exc_info=True)
 
     return text
 
 
-def thread(target: Callable, args: tuple) -> bool:
-    # Call a function using thread
+def take_token(key: int, the_type: str, reserve: float, now: float) -> float:
+    # Take a token from the bucket, return the secs to wait if there is no spare token, call under the rate lock
+    rate, capacity = glovar.rate_limits[the_type]
+
+    # Forget the idle chats, their buckets are full anyway
+    if len(glovar.rate_buckets) > 10000:
+        for k in [k for k, v in glovar.rate_buckets.items() if now - v[1] > capacity / rate]:
+            glovar.rate_buckets.pop(k, None)
+
+    bucket = glovar.rate_buckets.setdefault(key, [float(capacity), now])
+    bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+    bucket[1] = now
+    need = capacity * reserve + 1
+
+    if bucket[0] >= need:
+        bucket[0] -= 1
+        return 0.0
+
+    return (need - bucket[0]) / rate
+
+
+def thread(target: Callable, args: tuple, priority: str = "normal") -> bool:
+    # Call a function in the worker pool, the enforcement and the log tasks have their own workers
     try:
-        t = Thread(target=target, args=args)
-        t.daemon = True
-        t.start()
+        queue = {"enforce": glovar.tasks_enforce, "log": glovar.tasks_log}.get(priority, glovar.tasks)
+        queue.put((glovar.task_priorities[priority], next(glovar.task_index), time(), target, args))
 
         return True
     except Exception as e:
@@ -684,13 +1288,40 @@ def thread(target: Callable, args: tuple) -> bool:
     return False
 
 
-def wait_flood(e: FloodWait) -> bool:
-    # Wait flood secs
+def wait_flood(e: FloodWait, cid: int = 0, method: str = "") -> bool:
+    # Wait flood secs, the backoff is shared by the calls of the same method in the same chat through rate_limit
     try:
-        sleep(e.x + uniform(0.5, 1.0))
+        with glovar.locks["rate"]:
+            now = time()
+
+            # Forget the finished backoffs
+            for key in [key for key, until in glovar.flood_until.items() if until <= now]:
+                glovar.flood_until.pop(key, None)
+
+            until = max(glovar.flood_until.get((method, cid), 0.0), now + e.x)
+            glovar.flood_until[(method, cid)] = until
+
+        sleep(max(until - now, 0) + uniform(0.5, 1.0))
 
         return True
     except Exception as e:
         logger.warning(f"Wait flood error: {e}", exc_info=True)
 
     return False
+
+
+def work(queue: PriorityQueue) -> None:
+    # Run the tasks in the queue by priority, used by the worker threads
+    while True:
+        _, _, start, target, args = queue.get()
+        wait = time() - start
+
+        try:
+            target(*args)
+        except Exception as e:
+            logger.warning(f"Work {target.__name__} error: {e}", exc_info=True)
+
+        with glovar.locks["task"]:
+            glovar.task_count["done"] += 1
+            glovar.task_count["wait"] += wait
+            glovar.task_count["max"] = max(glovar.task_count["max"], wait)
@@ -17,17 +17,19 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-from os import remove
-from os.path import exists
-from pickle import dump
-from shutil import copyfile
-from typing import Any
-
-from pyAesCrypt import decryptFile, encryptFile
+from io import BytesIO
+from os import remove, replace
+from os.path import exists, getsize
+from pickle import dump, dumps, load, loads
+from shutil import copyfile, copyfileobj
+from time import time
+from typing import Any, List
+
+from pyAesCrypt import decryptFile, decryptStream, encryptFile, encryptStream
 from pyrogram import Client
 
 from .. import glovar
-from .etc import random_str, thread
+from .etc import random_str
 from .telegram import download_media
 
 # Enable logging
@@ -54,13 +56,16 @@ def crypt_file(operation: str, file_in: str, file_out: str) -> bool:
     return False
 
 
-def data_to_file(data: Any) -> str:
-    # Save data to a file in tmp directory
+def data_to_file(data: Any, encrypt: bool = False) -> str:
+    # Save data to a file in tmp directory, the encrypted file is written without a plain copy
     try:
         file_path = get_new_path()
 
         with open(file_path, "wb") as f:
-            dump(data, f)
+            if encrypt:
+                encryptStream(BytesIO(dumps(data)), f, glovar.password, 64 * 1024)
+            else:
+                dump(data, f)
 
         return file_path
     except Exception as e:
@@ -82,6 +87,39 @@ def delete_file(path: str) -> bool:
     return False
 
 
+def file_to_data(path: str, decrypt: bool = True) -> Any:
+    # Load data from a file, the small file is decrypted in memory, the large one is spilled to disk
+    result = None
+    try:
+        if not path:
+            return None
+
+        size = getsize(path)
+
+        if not decrypt:
+            with open(path, "rb") as f:
+                result = load(f)
+        elif size <= glovar.file_memory:
+            buffer = BytesIO()
+
+            with open(path, "rb") as f:
+                decryptStream(f, buffer, glovar.password, 64 * 1024, size)
+
+            result = loads(buffer.getvalue())
+        else:
+            path_decrypted = get_new_path()
+
+            if crypt_file("decrypt", path, path_decrypted):
+                with open(path_decrypted, "rb") as f:
+                    result = load(f)
+
+            delete_file(path_decrypted)
+    except Exception as e:
+        logger.warning(f"File to data error: {e}", exc_info=True)
+
+    return result
+
+
 def get_downloaded_path(client: Client, file_id: str, file_ref: str) -> str:
     # Download file, get it's path on local machine
     final_path = ""
@@ -113,10 +151,37 @@ def get_new_path(extension: str = "") -> str:
     return result
 
 
+def journal(file: str, op: str, keys: tuple, value: Any = None) -> bool:
+    # Record a mutation of the dataset, the persistence writer will append it to the journal
+    try:
+        if file not in glovar.journal_list:
+            return save(file)
+
+        # The database views write through, only the nested fields of the users are left
+        if glovar.database:
+            return file != "user_ids" or glovar.user_ids.apply(op, keys, value)
+
+        with glovar.locks["save"]:
+            glovar.journals.setdefault(file, []).append((op, keys, value))
+            glovar.save_count["request"] += 1
+
+        return True
+    except Exception as e:
+        logger.warning(f"Journal error: {e}", exc_info=True)
+
+    return False
+
+
 def save(file: str) -> bool:
-    # Save a global variable to a file
+    # Mark a global variable as dirty, the persistence writer will save it
     try:
-        thread(save_thread, (file,))
+        # The database is committed by the persistence writer anyway
+        if glovar.database and file in glovar.journal_list:
+            return True
+
+        with glovar.locks["save"]:
+            glovar.dirty.add(file)
+            glovar.save_count["request"] += 1
 
         return True
     except Exception as e:
@@ -125,19 +190,139 @@ def save(file: str) -> bool:
     return False
 
 
-def save_thread(file: str) -> bool:
-    # Save thread
+def save_data() -> bool:
+    # Save all the dirty global variables, called by the scheduler and on shutdown
+    try:
+        start = time()
+
+        with glovar.locks["save"]:
+            files = glovar.dirty
+            glovar.dirty = set()
+            journals = glovar.journals
+            glovar.journals = {}
+
+        glovar.store and glovar.store.commit()
+
+        if not files and not journals:
+            return True
+
+        # Append the journals
+        for file in journals:
+            # Fall back to a snapshot
+            if not save_journal(file, journals[file]):
+                files.add(file)
+                continue
+
+            count = glovar.journal_count.get(file, 0) + len(journals[file])
+            glovar.journal_count[file] = count
+
+            if count >= glovar.journal_limit:
+                files.add(file)
+
+        # Write the snapshots
+        written = 0
+
+        for file in files:
+            if file in glovar.journal_list:
+                result = save_snapshot(file)
+            else:
+                result = save_file(file)
+
+            if result:
+                written += 1
+                continue
+
+            # Try again in the next flush
+            with glovar.locks["save"]:
+                glovar.dirty.add(file)
+
+        cost = time() - start
+
+        with glovar.locks["save"]:
+            glovar.save_count["journal"] += sum(len(journals[file]) for file in journals)
+            glovar.save_count["write"] += written
+            glovar.save_count["flush"] += 1
+            glovar.save_count["time"] = cost
+            glovar.save_count["max"] = max(glovar.save_count["max"], cost)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Save data error: {e}", exc_info=True)
+
+    return False
+
+
+def save_file(file: str) -> bool:
+    # Save a global variable to a file, replace the file atomically
     try:
         if not glovar:
             return True
 
-        with open(f"data/.{file}", "wb") as f:
+        with open(f"data/.{file}.tmp", "wb") as f:
             dump(eval(f"glovar.{file}"), f)
 
-        copyfile(f"data/.{file}", f"data/{file}")
+            # The generation of the journal that the snapshot starts from, the older journals are skipped on replay
+            if file in glovar.journal_list:
+                dump(glovar.journal_seq.get(file, 0), f)
+
+        replace(f"data/.{file}.tmp", f"data/.{file}")
+        copyfile(f"data/.{file}", f"data/{file}.tmp")
+        replace(f"data/{file}.tmp", f"data/{file}")
+
+        return True
+    except Exception as e:
+        logger.error(f"Save file error: {e}", exc_info=True)
+
+    return False
+
+
+def save_journal(file: str, records: List[tuple]) -> bool:
+    # Append the records to the dataset's journal
+    try:
+        path = f"data/{file}.journal"
+        header = not exists(path)
+
+        with open(path, "ab") as f:
+            # Mark the generation of the new journal
+            if header:
+                dump(("seq", (), glovar.journal_seq.get(file, 0)), f)
+
+            for record in records:
+                dump(record, f)
+
+        return True
+    except Exception as e:
+        logger.error(f"Save journal error: {e}", exc_info=True)
+
+    return False
+
+
+def save_snapshot(file: str) -> bool:
+    # Compact the dataset's journal into a new snapshot
+    try:
+        path = f"data/{file}.journal"
+        path_old = f"data/{file}.journal.old"
+
+        # Rotate the journal, the records in it are already applied to the global variable
+        if exists(path) and exists(path_old):
+            with open(path, "rb") as f_in, open(path_old, "ab") as f_out:
+                copyfileobj(f_in, f_out)
+
+            remove(path)
+        elif exists(path):
+            replace(path, path_old)
+
+        # The rotated records belong to the older generations, the new snapshot contains them
+        glovar.journal_seq[file] = glovar.journal_seq.get(file, 0) + 1
+
+        if not save_file(file):
+            return False
+
+        delete_file(path_old)
+        glovar.journal_count[file] = 0
 
         return True
     except Exception as e:
-        logger.error(f"Save thread error: {e}", exc_info=True)
+        logger.error(f"Save snapshot error: {e}", exc_info=True)
 
     return False
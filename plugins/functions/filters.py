@@ -18,15 +18,15 @@
 
 import logging
 import re
-from copy import deepcopy
 from string import ascii_lowercase
-from typing import Match, Optional, Union
+from typing import List, Match, Optional, Set, Tuple, Union
 
 from pyrogram import CallbackQuery, Client, Filters, Message, User
 
 from .. import glovar
 from .channel import get_content, get_forward_name, get_full_name
-from .etc import get_filename, get_lang, get_links, get_now, get_text, lang
+from .etc import compile_regex, get_filename, get_from_name, get_lang, get_lang_candidates, get_links, get_now
+from .etc import get_emoji_dict, get_regex_index, get_text, lang
 from .file import save
 from .group import get_description, get_group_sticker, get_pinned
 from .ids import init_group_id
@@ -298,30 +298,242 @@ test_group = Filters.create(
 )
 
 
-def is_ad_text(text: str, ocr: bool, matched: str = "") -> str:
-    # Check if the text is ad text
+def count_regex_hits(scan: dict, word_types: List[str]) -> bool:
+    # Count the hit rules of the checked word types
+    try:
+        for word_type in word_types:
+            word = scan["hits"].get(word_type)
+
+            if word:
+                count_regex_word(word_type, word)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Count regex hits error: {e}", exc_info=True)
+
+    return False
+
+
+def count_regex_word(word_type: str, word: str) -> bool:
+    # Count a hit rule
+    try:
+        words = glovar.words[word_type]
+        words[word] = words.get(word, 0) + 1
+        save(f"{word_type}_words")
+
+        return True
+    except Exception as e:
+        logger.warning(f"Count regex word error: {e}", exc_info=True)
+
+    return False
+
+
+def get_regex_first(scan: dict, word_types: List[str], skip: str = "") -> str:
+    # Get the first word type that the scanned text hits
+    result = ""
+    try:
+        for word_type in word_types:
+            if word_type != skip and is_regex_hit(scan, word_type):
+                return word_type
+    except Exception as e:
+        logger.warning(f"Get regex first error: {e}", exc_info=True)
+
+    return result
+
+
+def get_regex_literals(rules: dict, text: str) -> Optional[Set[str]]:
+    # Get the indexed literals that occur in the text, None means every rule should be checked
+    result = set()
+    try:
+        index = rules["index"]
+
+        if not index:
+            return result
+
+        prefixes = rules["prefixes"]
+
+        for match in index.finditer(text):
+            found = prefixes.get(match.group(1).lower())
+
+            # Case folding beyond lower(), can not tell which literal it is
+            if found is None:
+                return None
+
+            result |= found
+    except Exception as e:
+        logger.warning(f"Get regex literals error: {e}", exc_info=True)
+        result = None
+
+    return result
+
+
+def get_regex_match(word_type: str, text: str, ocr: bool = False) -> Optional[Match]:
+    # Get the first match of the word type's rules in the text, count the hit rule
+    result = None
+    try:
+        rules = get_regex_rules(word_type)
+        word, result = get_regex_search(rules, text, ocr, get_regex_literals(rules, text))
+
+        if result:
+            count_regex_word(word_type, word)
+    except Exception as e:
+        logger.warning(f"Get regex match error: {e}", exc_info=True)
+
+    return result
+
+
+def get_regex_rules(word_type: str) -> dict:
+    # Get the compiled regex rules of the word type
+    result = {}
+    try:
+        result = glovar.compiled.get(word_type)
+
+        if result is None:
+            with glovar.locks["regex"]:
+                result = glovar.compiled.get(word_type)
+                result = result if result is not None else compile_regex(word_type)
+    except Exception as e:
+        logger.warning(f"Get regex rules error: {e}", exc_info=True)
+
+    return result
+
+
+def get_regex_scan(word_types: List[str], text: str, ocr: bool = False) -> dict:
+    # Get the lazy scan of the text, the literals of all the word types are found in one pass when it is first used
+    result = {
+        "hits": {},
+        "literals": {},
+        "ocr": ocr,
+        "texts": []
+    }
     try:
         if not text:
+            return result
+
+        text = re.sub(r"\s{2,}", " ", text)
+        stripped = (" " in text and re.sub(r"\s", "", text)) or ""
+        result["texts"] = [t for t in [text, stripped] if t]
+
+        key = tuple(word_types)
+        index = glovar.scans.get(key)
+
+        if index is None:
+            with glovar.locks["regex"]:
+                literals = set()
+
+                for word_type in word_types:
+                    rules = glovar.compiled.get(word_type)
+                    rules = rules if rules is not None else compile_regex(word_type)
+                    literals |= {literal for _, _, literal in rules["all"] if literal}
+
+                index = get_regex_index(literals)
+                glovar.scans[key] = index
+
+        result["index"] = index
+    except Exception as e:
+        logger.warning(f"Get regex scan error: {e}", exc_info=True)
+
+    return result
+
+
+def get_regex_search(rules: dict, text: str, ocr: bool, literals: Optional[Set[str]]) -> Tuple[str, Optional[Match]]:
+    # Get the first hit rule and its match, the rules whose required literal is not in the text are skipped
+    try:
+        for word, pattern, literal in rules[(ocr and "ocr") or "all"]:
+            if literal and literals is not None and literal not in literals:
+                continue
+
+            result = pattern.search(text)
+
+            if result:
+                return word, result
+    except Exception as e:
+        logger.warning(f"Get regex search error: {e}", exc_info=True)
+
+    return "", None
+
+
+def get_sticker_lang(client: Client, gid: int, message: Message) -> str:
+    # Get the language result of the message's sticker
+    result = ""
+
+    try:
+        if not message.sticker or not message.sticker.set_name:
+            return ""
+
+        # Bypass
+        sticker_name = message.sticker.set_name
+
+        if sticker_name == get_group_sticker(client, gid):
             return ""
 
-        for c in ascii_lowercase:
-            if c != matched and is_regex_text(f"ad{c}", text, ocr):
-                return c
+        sticker_title = get_sticker_title(client, sticker_name)
+
+        if sticker_title in glovar.except_ids["long"]:
+            return ""
+
+        the_lang = is_in_config(gid, "sticker", sticker_title)
+
+        if the_lang:
+            result = f"text {the_lang} {sticker_title}"
     except Exception as e:
-        logger.warning(f"Is ad text error: {e}", exc_info=True)
+        logger.warning(f"Get sticker lang error: {e}", exc_info=True)
+
+    return result
 
-    return ""
 
+def get_text_lang(gid: int, message: Message) -> str:
+    # Get the language result of the message's text, filename, game title and via bot's name
+    result = ""
 
-def is_ban_text(text: str, ocr: bool, message: Message = None) -> bool:
-    # Check if the text is ban text
     try:
-        if is_regex_text("ban", text, ocr):
-            return True
+        # Plain text
+        the_lang = is_in_config(gid, "text", get_text(message))
+
+        if the_lang:
+            return f"text {the_lang}"
+
+        # Filename
+        the_lang = is_in_config(gid, "text", get_filename(message))
+
+        if the_lang:
+            return f"text {the_lang}"
+
+        # Game
+        if message.game:
+            the_lang = is_in_config(gid, "text", message.game.title)
+
+            if the_lang:
+                return f"text {the_lang}"
+
+        # Via Bot
+        if message.via_bot:
+            name = get_full_name(message.via_bot)
+
+            if name not in glovar.except_ids["long"]:
+                the_lang = is_in_config(gid, "text", name)
+
+                if the_lang:
+                    return f"text {the_lang} {name}"
+    except Exception as e:
+        logger.warning(f"Get text lang error: {e}", exc_info=True)
+
+    return result
+
+
+def is_ban_text(text: str, ocr: bool, message: Message = None, scan: dict = None) -> bool:
+    # Check if the text is ban text, every hit rule of the checked word types is counted
+    try:
+        if scan is None:
+            scan = get_regex_scan(glovar.ban_types, text, ocr)
+
+        if is_regex_hit(scan, "ban"):
+            return count_regex_hits(scan, ["ban"])
 
         # ad + con
-        ad = is_regex_text("ad", text, ocr)
-        con = is_con_text(text, ocr)
+        ad = is_regex_hit(scan, "ad")
+        con = get_regex_first(scan, ["con", "iml", "pho"])
+        count_regex_hits(scan, ["ad", con])
 
         if ad and con:
             return True
@@ -333,7 +545,9 @@ def is_ban_text(text: str, ocr: bool, message: Message = None) -> bool:
             return True
 
         # ad_ + con
-        ad = is_ad_text(text, ocr)
+        ad_types = [f"ad{c}" for c in ascii_lowercase]
+        ad = get_regex_first(scan, ad_types)
+        count_regex_hits(scan, [ad])
 
         if ad and con:
             return True
@@ -344,14 +558,42 @@ def is_ban_text(text: str, ocr: bool, message: Message = None) -> bool:
 
         # ad_ + ad_
         if ad:
-            ad = is_ad_text(text, ocr, ad)
-            return bool(ad)
+            ad_other = get_regex_first(scan, ad_types, ad)
+            count_regex_hits(scan, [ad_other])
+            return bool(ad_other)
     except Exception as e:
         logger.warning(f"Is ban text error: {e}", exc_info=True)
 
     return False
 
 
+def is_bypassed_message(client: Client, message: Message) -> bool:
+    # Check if the message is quoted from the group's description or pinned message
+    try:
+        gid = message.chat.id
+        message_content = get_content(message)
+        message_text = get_text(message)
+        description = get_description(client, gid)
+
+        if (description and message_text) and message_text in description:
+            return True
+
+        pinned_message = get_pinned(client, gid)
+        pinned_content = get_content(pinned_message)
+
+        if (pinned_content and message_content) and message_content in pinned_content:
+            return True
+
+        pinned_text = get_text(pinned_message)
+
+        if (pinned_text and message_text) and message_text in pinned_text:
+            return True
+    except Exception as e:
+        logger.warning(f"Is bypassed message error: {e}", exc_info=True)
+
+    return False
+
+
 def is_class_d_user(user: Union[int, User]) -> bool:
     # Check if the user is a Class D personnel
     try:
@@ -379,26 +621,10 @@ def is_class_e_user(user: Union[int, User]) -> bool:
         if uid in glovar.bot_ids:
             return True
 
-        group_list = list(glovar.trust_ids)
-
-        for gid in group_list:
-            if uid in glovar.trust_ids.get(gid, set()):
-                return True
-    except Exception as e:
-        logger.warning(f"Is class e user error: {e}", exc_info=True)
-
-    return False
-
-
-def is_con_text(text: str, ocr: bool) -> bool:
-    # Check if the text is con text
-    try:
-        if (is_regex_text("con", text, ocr)
-                or is_regex_text("iml", text, ocr)
-                or is_regex_text("pho", text, ocr)):
+        if glovar.trusted_ids.get(uid):
             return True
     except Exception as e:
-        logger.warning(f"Is con text error: {e}", exc_info=True)
+        logger.warning(f"Is class e user error: {e}", exc_info=True)
 
     return False
 
@@ -475,16 +701,8 @@ def is_emoji(the_type: str, text: str, message: Message = None) -> bool:
         if message:
             text = get_text(message, False, False)
 
-        emoji_dict = {}
-        emoji_set = {emoji for emoji in glovar.emoji_set if emoji in text and emoji not in glovar.emoji_protect}
-        emoji_old_set = deepcopy(emoji_set)
-
-        for emoji in emoji_old_set:
-            if any(emoji in emoji_old and emoji != emoji_old for emoji_old in emoji_old_set):
-                emoji_set.discard(emoji)
-
-        for emoji in emoji_set:
-            emoji_dict[emoji] = text.count(emoji)
+        emoji_dict = {emoji: count for emoji, count in get_emoji_dict(text).items()
+                      if emoji not in glovar.emoji_protect}
 
         # Check ad
         if the_type == "ad":
@@ -539,27 +757,32 @@ def is_in_config(gid: int, the_type: str, text: str = None) -> Union[bool, str]:
     result = False
 
     try:
-        config = glovar.configs.get(gid, {})
+        policy = glovar.policies.get(gid)
 
-        if not config:
+        if policy is None:
             return False
 
-        if not config.get(the_type):
+        langs = getattr(policy, the_type)
+
+        if not langs:
             return False
 
-        if isinstance(config[the_type], bool):
+        if isinstance(langs, bool):
             return True
 
-        if not config[the_type].get("enable") or not config[the_type].get("list"):
-            return False
-
         if text is None:
             return True
 
+        # Rule out the text by its scripts
+        candidates = get_lang_candidates(text)
+
+        if candidates is not None and not candidates & langs:
+            return False
+
         flood = gid in glovar.flooded_ids
         the_lang = get_lang(text, flood)
 
-        if the_lang and the_lang in config[the_type]["list"]:
+        if the_lang and the_lang in langs:
             return the_lang
     except Exception as e:
         logger.warning(f"Is in config error: {e}", exc_info=True)
@@ -641,9 +864,13 @@ def is_new_user(user: User, now: int, gid: int = 0, joined: bool = False) -> boo
 def is_nm_text(text: str) -> bool:
     # Check if the text is nm text
     try:
-        if (is_regex_text("nm", text)
-                or is_regex_text("bio", text)
-                or is_ban_text(text, False)):
+        scan = get_regex_scan(["nm", "bio"] + glovar.ban_types, text)
+        hit = get_regex_first(scan, ["nm", "bio"])
+
+        if hit:
+            return count_regex_hits(scan, [hit])
+
+        if is_ban_text(text, False, None, scan):
             return True
     except Exception as e:
         logger.warning(f"Is nm text error: {e}", exc_info=True)
@@ -662,133 +889,62 @@ def is_not_allowed(client: Client, message: Message, text: str = None) -> str:
 
         # Regular message
         if not text:
-            # Check detected records
-
-            # If the user is being punished
-            if is_detected_user(message):
-                return "true true"
-
-            # If the message has been detected
-            content = get_content(message)
-            if content:
-                detection = glovar.contents.get(content, "")
+            # Run the checks which can fire in the group, the expensive data is got only when necessary
+            for check in glovar.policies.get(gid, glovar.policy_empty).plan:
+                result = ""
 
-                if detection and is_in_config(gid, "text", detection):
-                    return detection
+                # If the user is being punished
+                if check == "detected":
+                    if is_detected_user(message):
+                        return "true true"
 
-            # Url
-            detected_url = is_detected_url(message)
+                # If the message has been detected
+                elif check == "content":
+                    content = get_content(message)
+                    detection = content and glovar.contents.get(content, "")
 
-            if detected_url:
-                return detected_url
+                    if detection and is_in_config(gid, "text", detection):
+                        return detection
 
-            # Start detect
+                # Url
+                elif check == "url":
+                    detected_url = is_detected_url(message)
 
-            # Check name
+                    if detected_url:
+                        return detected_url
 
-            if is_in_config(gid, "name"):
+                # Check the forward from name and the user's name
+                elif check == "name":
+                    for name in [get_forward_name(message), get_from_name(message)]:
+                        if not name or name in glovar.except_ids["long"]:
+                            continue
 
-                # Check the forward from name:
-                forward_name = get_forward_name(message)
-
-                if forward_name and forward_name not in glovar.except_ids["long"]:
-                    the_lang = is_in_config(gid, "name", forward_name)
-                    if the_lang:
-                        return f"name {the_lang}"
-
-                # Check the user's name
-                name = get_full_name(message.from_user)
-
-                if name and name not in glovar.except_ids["long"]:
-                    the_lang = is_in_config(gid, "name", name)
-                    if the_lang:
-                        return f"name {the_lang}"
-
-            # Check text
-
-            # Bypass
-            message_content = get_content(message)
-            message_text = get_text(message)
-            description = get_description(client, gid)
-
-            if (description and message_text) and message_text in description:
-                return ""
-
-            pinned_message = get_pinned(client, gid)
-            pinned_content = get_content(pinned_message)
-
-            if (pinned_content and message_content) and message_content in pinned_content:
-                return ""
-
-            pinned_text = get_text(pinned_message)
-
-            if (pinned_text and message_text) and message_text in pinned_text:
-                return ""
-
-            # Languages
-            if is_in_config(gid, "text"):
-                # Plain text
-                the_lang = is_in_config(gid, "text", message_text)
-
-                if the_lang:
-                    return f"text {the_lang}"
-
-                # Filename
-                file_name = get_filename(message)
-                the_lang = is_in_config(gid, "text", file_name)
-
-                if the_lang:
-                    return f"text {the_lang}"
-
-                # Game
-                if message.game:
-                    game_title = message.game.title
-                    the_lang = is_in_config(gid, "text", game_title)
-
-                    if the_lang:
-                        return f"text {the_lang}"
-
-                # Via Bot
-                if message.via_bot:
-                    name = get_full_name(message.via_bot)
-
-                    if name not in glovar.except_ids["long"]:
-                        the_lang = is_in_config(gid, "text", name)
+                        the_lang = is_in_config(gid, "name", name)
 
                         if the_lang:
-                            return f"text {the_lang} {name}"
-
-            # Special Chinese Characters
-            if is_in_config(gid, "spc"):
-                if is_regex_text("spc", message_text):
-                    return f"text {lang('spc')}"
+                            return f"name {the_lang}"
 
-            # Special English Characters
-            if is_in_config(gid, "spe"):
-                if is_regex_text("spe", message_text):
-                    return f"text {lang('spe')}"
-
-            # Check Sticker
-            if is_in_config(gid, "sticker"):
-                # Bypass
-                group_sticker = get_group_sticker(client, gid)
+                # Languages
+                elif check == "text":
+                    result = get_text_lang(gid, message)
 
-                if message.sticker:
-                    sticker_name = message.sticker.set_name
+                # Special Chinese Characters and Special English Characters
+                elif check in {"spc", "spe"}:
+                    if is_regex_text(check, get_text(message)):
+                        result = f"text {lang(check)}"
 
-                    if sticker_name and sticker_name == group_sticker:
-                        return ""
-                else:
-                    sticker_name = ""
+                # Check Sticker
+                elif check == "sticker":
+                    result = get_sticker_lang(client, gid, message)
 
-                if sticker_name:
-                    sticker_title = get_sticker_title(client, sticker_name)
+                if not result:
+                    continue
 
-                    if sticker_title not in glovar.except_ids["long"]:
-                        the_lang = is_in_config(gid, "sticker", sticker_title)
+                # Bypass
+                if is_bypassed_message(client, message):
+                    return ""
 
-                        if the_lang:
-                            return f"text {the_lang} {sticker_title}"
+                return result
 
         # Preview message
         else:
@@ -801,6 +957,32 @@ def is_not_allowed(client: Client, message: Message, text: str = None) -> str:
     return ""
 
 
+def is_regex_hit(scan: dict, word_type: str) -> bool:
+    # Check if the scanned text hits one of the scan's word types, the hit rule is recorded but not counted
+    try:
+        hits = scan["hits"]
+
+        if word_type in hits:
+            return bool(hits[word_type])
+
+        hits[word_type] = ""
+        rules = get_regex_rules(word_type)
+
+        for text in scan["texts"]:
+            if text not in scan["literals"]:
+                scan["literals"][text] = get_regex_literals(scan["index"], text)
+
+            word, match = get_regex_search(rules, text, scan["ocr"], scan["literals"][text])
+
+            if match:
+                hits[word_type] = word
+                return True
+    except Exception as e:
+        logger.warning(f"Is regex hit error: {e}", exc_info=True)
+
+    return False
+
+
 def is_regex_text(word_type: str, text: str, ocr: bool = False, again: bool = False) -> Optional[Match]:
     # Check if the text hit the regex rules
     result = None
@@ -815,22 +997,10 @@ def is_regex_text(word_type: str, text: str, ocr: bool = False, again: bool = Fa
         else:
             return None
 
-        with glovar.locks["regex"]:
-            words = list(eval(f"glovar.{word_type}_words"))
-
-        for word in words:
-            if ocr and "(?# nocr)" in word:
-                continue
+        result = get_regex_match(word_type, text, ocr)
 
-            result = re.search(word, text, re.I | re.S | re.M)
-
-            # Count and return
-            if result:
-                count = eval(f"glovar.{word_type}_words").get(word, 0)
-                count += 1
-                eval(f"glovar.{word_type}_words")[word] = count
-                save(f"{word_type}_words")
-                return result
+        if result:
+            return result
 
         # Try again
         return is_regex_text(word_type, text, ocr, True)
@@ -860,17 +1030,11 @@ def is_watch_user(user: User, the_type: str, now: int) -> bool:
 def is_wb_text(text: str, ocr: bool) -> bool:
     # Check if the text is wb text
     try:
-        if (is_regex_text("wb", text, ocr)
-                or is_regex_text("ad", text, ocr)
-                or is_regex_text("iml", text, ocr)
-                or is_regex_text("pho", text, ocr)
-                or is_regex_text("sho", text, ocr)
-                or is_regex_text("spc", text, ocr)):
-            return True
+        scan = get_regex_scan(glovar.wb_types, text, ocr)
+        hit = get_regex_first(scan, glovar.wb_types)
 
-        for c in ascii_lowercase:
-            if c not in {"i"} and is_regex_text(f"ad{c}", text, ocr):
-                return True
+        if hit:
+            return count_regex_hits(scan, [hit])
     except Exception as e:
         logger.warning(f"Is wb text error: {e}", exc_info=True)
 
@@ -22,8 +22,9 @@ from typing import Optional
 from pyrogram import Chat, Client, Message
 
 from .. import glovar
-from .etc import code, lang, t2t, thread
+from .etc import code, delay, lang, t2t, thread
 from .file import save
+from .ids import update_policy, update_trust_ids
 from .telegram import delete_messages, get_chat, leave_chat
 
 # Enable logging
@@ -31,13 +32,19 @@ logger = logging.getLogger(__name__)
 
 
 def delete_message(client: Client, gid: int, mid: int) -> bool:
-    # Delete a single message
+    # Delete a single message, the messages of the chat are collected for a short window and deleted in a batch
     try:
         if not gid or not mid:
             return True
 
-        mids = [mid]
-        thread(delete_messages, (client, gid, mids))
+        with glovar.locks["delete"]:
+            pending = gid in glovar.deletions
+            glovar.deletions.setdefault(gid, set()).add(mid)
+
+        if pending:
+            return True
+
+        delay(glovar.deletions_window, delete_pending, [client, gid], "enforce")
 
         return True
     except Exception as e:
@@ -46,6 +53,24 @@ def delete_message(client: Client, gid: int, mid: int) -> bool:
     return False
 
 
+def delete_pending(client: Client, gid: int) -> bool:
+    # Delete the collected messages of the chat
+    try:
+        with glovar.locks["delete"]:
+            mids = glovar.deletions.pop(gid, set())
+
+        if not mids:
+            return True
+
+        delete_messages(client, gid, sorted(mids))
+
+        return True
+    except Exception as e:
+        logger.warning(f"Delete pending error: {e}", exc_info=True)
+
+    return False
+
+
 def get_config_text(config: dict) -> str:
     # Get config text
     result = ""
@@ -152,15 +177,15 @@ def leave_group(client: Client, gid: int) -> bool:
     try:
         glovar.left_group_ids.add(gid)
         save("left_group_ids")
-        thread(leave_chat, (client, gid))
+        thread(leave_chat, (client, gid), "enforce")
 
         glovar.admin_ids.pop(gid, set())
         save("admin_ids")
 
-        glovar.trust_ids.pop(gid, set())
-        save("trust_ids")
+        update_trust_ids(gid)
 
         glovar.configs.pop(gid, {})
+        update_policy(gid)
         save("configs")
 
         glovar.declared_message_ids.pop(gid, set())
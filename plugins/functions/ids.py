@@ -18,9 +18,11 @@
 
 import logging
 from copy import deepcopy
+from typing import Optional, Set
 
 from .. import glovar
-from .file import save
+from .file import journal, save
+from .policy import get_policy
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -45,6 +47,7 @@ def init_group_id(gid: int) -> bool:
 
         if glovar.configs.get(gid) is None:
             glovar.configs[gid] = deepcopy(glovar.default_config)
+            update_policy(gid)
             save("configs")
 
         if glovar.declared_message_ids.get(gid) is None:
@@ -60,12 +63,89 @@ def init_group_id(gid: int) -> bool:
     return False
 
 
+def reset_policies() -> bool:
+    # Recompile the configs of all groups
+    try:
+        glovar.policies = {gid: get_policy(glovar.configs[gid]) for gid in list(glovar.configs)}
+
+        return True
+    except Exception as e:
+        logger.warning(f"Reset policies error: {e}", exc_info=True)
+
+    return False
+
+
+def reset_trusted_ids() -> bool:
+    # Rebuild the reverse index of the trust lists
+    try:
+        with glovar.locks["trust"]:
+            glovar.trusted_ids = {}
+
+            for gid in list(glovar.trust_ids):
+                for uid in glovar.trust_ids[gid]:
+                    glovar.trusted_ids.setdefault(uid, set()).add(gid)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Reset trusted ids error: {e}", exc_info=True)
+
+    return False
+
+
+def update_policy(gid: int) -> bool:
+    # Recompile the group's config, remove the group's policy if it has no config
+    try:
+        config = glovar.configs.get(gid)
+
+        if config is None:
+            glovar.policies.pop(gid, None)
+        else:
+            glovar.policies[gid] = get_policy(config)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Update policy error: {e}", exc_info=True)
+
+    return False
+
+
+def update_trust_ids(gid: int, uids: Optional[Set[int]] = None) -> bool:
+    # Update the group's trust list and the reverse index, remove the group if uids is None
+    try:
+        with glovar.locks["trust"]:
+            if uids is None:
+                previous = glovar.trust_ids.pop(gid, set())
+                uids = set()
+            else:
+                previous = glovar.trust_ids.get(gid, set())
+                glovar.trust_ids[gid] = uids
+
+            for uid in previous - uids:
+                groups = glovar.trusted_ids.get(uid, set())
+                groups.discard(gid)
+
+                if not groups:
+                    glovar.trusted_ids.pop(uid, set())
+
+            for uid in uids - previous:
+                glovar.trusted_ids.setdefault(uid, set()).add(gid)
+
+        save("trust_ids")
+
+        return True
+    except Exception as e:
+        logger.warning(f"Update trust ids error: {e}", exc_info=True)
+
+    return False
+
+
 def init_user_id(uid: int) -> bool:
     # Init user data
     try:
-        if glovar.user_ids.get(uid) is None:
-            glovar.user_ids[uid] = deepcopy(glovar.default_user_status)
-            save("user_ids")
+        with glovar.locks["user"]:
+            if glovar.user_ids.get(uid) is None:
+                glovar.user_ids[uid] = deepcopy(glovar.default_user_status)
+                journal("user_ids", "set", (uid,), deepcopy(glovar.default_user_status))
 
         return True
     except Exception as e:
@@ -0,0 +1,72 @@
+# SCP-079-LANG - Ban or delete by detecting the language
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-LANG.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from typing import FrozenSet, List, NamedTuple, Optional, Tuple
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# The checks of is_not_allowed in order, with the config type which enables each of them
+checks: List[Tuple[str, Optional[str]]] = [
+    ("detected", None),
+    ("content", "text"),
+    ("url", None),
+    ("name", "name"),
+    ("text", "text"),
+    ("spc", "spc"),
+    ("spe", "spe"),
+    ("sticker", "sticker")
+]
+
+
+class Policy(NamedTuple):
+    # The compiled config of a group, it is never changed, a new one replaces it when the config changes
+    bio: FrozenSet[str] = frozenset()
+    name: FrozenSet[str] = frozenset()
+    sticker: FrozenSet[str] = frozenset()
+    text: FrozenSet[str] = frozenset()
+    spc: bool = False
+    spe: bool = False
+    plan: Tuple[str, ...] = tuple(check for check, the_type in checks if the_type is None)
+
+
+def get_policy(config: dict) -> Policy:
+    # Compile the group's config, the language types are empty if they are disabled
+    result = Policy()
+
+    try:
+        if not config:
+            return result
+
+        langs = {}
+
+        for the_type in ["bio", "name", "sticker", "text"]:
+            if not config.get(the_type) or not config[the_type].get("enable"):
+                langs[the_type] = frozenset()
+            else:
+                langs[the_type] = frozenset(config[the_type].get("list") or ())
+
+        flags = {the_type: bool(config.get(the_type)) for the_type in ["spc", "spe"]}
+        enabled = {the_type for the_type, value in list(langs.items()) + list(flags.items()) if value}
+        plan = tuple(check for check, the_type in checks if the_type is None or the_type in enabled)
+        result = Policy(plan=plan, **langs, **flags)
+    except Exception as e:
+        logger.warning(f"Get policy error: {e}", exc_info=True)
+
+    return result
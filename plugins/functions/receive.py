@@ -17,7 +17,6 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-import pickle
 from copy import deepcopy
 from json import loads
 from typing import Any
@@ -26,14 +25,15 @@ from pyrogram import Client, InlineKeyboardButton, InlineKeyboardMarkup, Message
 
 from .. import glovar
 from .channel import get_content, get_debug_text, share_data
-from .etc import code, crypt_str, general_link, get_int, get_now, get_report_record, get_stripped_link, get_text, lang
-from .etc import mention_id, thread
-from .file import crypt_file, data_to_file, delete_file, get_new_path, get_downloaded_path, save
+from .etc import code, compile_regex, compile_special, crypt_str, general_link, get_int, get_now, get_report_record
+from .etc import get_stripped_link, get_text, lang, mention_id, thread
+from .file import data_to_file, delete_file, file_to_data, get_downloaded_path, journal, save
 from .filters import is_class_e, is_declared_message_id, is_detected_user_id, is_not_allowed
 from .group import get_config_text, leave_group
-from .ids import init_group_id, init_user_id
+from .ids import init_group_id, init_user_id, reset_policies, reset_trusted_ids, update_policy
+from .store import UserDict, load_data
 from .telegram import get_messages, send_message, send_report_message
-from .timers import update_admins
+from .timers import send_count, update_admins
 from .user import terminate_user
 
 # Enable logging
@@ -50,12 +50,12 @@ def receive_add_bad(sender: str, data: dict) -> bool:
         # Receive bad channel
         if sender == "MANAGE" and the_type == "channel":
             glovar.bad_ids["channels"].add(the_id)
+            journal("bad_ids", "add", ("channels",), the_id)
 
         # Receive bad user
         if the_type == "user":
             glovar.bad_ids["users"].add(the_id)
-
-        save("bad_ids")
+            journal("bad_ids", "add", ("users",), the_id)
 
         return True
     except Exception as e:
@@ -165,7 +165,7 @@ def receive_captcha_kicked_user(data: dict) -> bool:
             return True
 
         glovar.user_ids[uid]["join"].pop(gid, 0)
-        save("user_ids")
+        journal("user_ids", "pop", (uid, "join", gid))
 
         result = True
     except Exception as e:
@@ -195,9 +195,11 @@ def receive_captcha_kicked_users(client: Client, message: Message, data: int) ->
 
         # Remove group status
         for uid in uids:
-            glovar.user_ids.get(uid, {}) and glovar.user_ids[uid]["join"].pop(gid, 0)
+            if not glovar.user_ids.get(uid, {}):
+                continue
 
-        save("user_ids")
+            glovar.user_ids[uid]["join"].pop(gid, 0)
+            journal("user_ids", "pop", (uid, "join", gid))
 
         result = True
     except Exception as e:
@@ -219,9 +221,9 @@ def receive_clear_data(client: Client, data_type: str, data: dict) -> bool:
         # Clear bad data
         if data_type == "bad":
             if the_type == "channels":
-                glovar.bad_ids["channels"] = set()
+                glovar.bad_ids["channels"].clear()
             elif the_type == "users":
-                glovar.bad_ids["users"] = set()
+                glovar.bad_ids["users"].clear()
 
             save("bad_ids")
 
@@ -239,24 +241,21 @@ def receive_clear_data(client: Client, data_type: str, data: dict) -> bool:
         # Clear user data
         if data_type == "user":
             if the_type == "all":
-                glovar.user_ids = {}
+                glovar.user_ids.clear()
             elif the_type == "new":
-                for uid in list(glovar.user_ids):
-                    glovar.user_ids[uid]["join"] = {}
+                glovar.user_ids.clear_join()
 
             save("user_ids")
 
         # Clear watch data
         if data_type == "watch":
             if the_type == "all":
-                glovar.watch_ids = {
-                    "ban": {},
-                    "delete": {}
-                }
+                glovar.watch_ids["ban"].clear()
+                glovar.watch_ids["delete"].clear()
             elif the_type == "ban":
-                glovar.watch_ids["ban"] = {}
+                glovar.watch_ids["ban"].clear()
             elif the_type == "delete":
-                glovar.watch_ids["delete"] = {}
+                glovar.watch_ids["delete"].clear()
 
             save("watch_ids")
 
@@ -265,7 +264,7 @@ def receive_clear_data(client: Client, data_type: str, data: dict) -> bool:
                 f"{lang('admin_project')}{lang('colon')}{mention_id(aid)}\n"
                 f"{lang('action')}{lang('colon')}{code(lang('clear'))}\n"
                 f"{lang('more')}{lang('colon')}{code(f'{data_type} {the_type}')}\n")
-        thread(send_message, (client, glovar.debug_channel_id, text))
+        thread(send_message, (client, glovar.debug_channel_id, text), "log")
     except Exception as e:
         logger.warning(f"Receive clear data: {e}", exc_info=True)
     finally:
@@ -285,6 +284,7 @@ def receive_config_commit(data: dict) -> bool:
             config[the_type]["list"] = set(config[the_type]["list"])
 
         glovar.configs[gid] = config
+        update_policy(gid)
         save("configs")
 
         return True
@@ -344,7 +344,7 @@ def receive_config_show(client: Client, data: dict) -> bool:
                        f"{lang('reason')}{lang('colon')}{code(lang('reason_none'))}\n")
 
         # Send the text data
-        file = data_to_file(result)
+        file = data_to_file(result, True)
         share_data(
             client=client,
             receivers=["MANAGE"],
@@ -355,7 +355,8 @@ def receive_config_show(client: Client, data: dict) -> bool:
                 "message_id": mid,
                 "group_id": gid
             },
-            file=file
+            file=file,
+            encrypt=False
         )
 
         return True
@@ -399,21 +400,8 @@ def receive_file_data(client: Client, message: Message, decrypt: bool = True) ->
         if not path:
             return None
 
-        if decrypt:
-            # Decrypt the file, save to the tmp directory
-            path_decrypted = get_new_path()
-            crypt_file("decrypt", path, path_decrypted)
-            path_final = path_decrypted
-        else:
-            # Read the file directly
-            path_decrypted = ""
-            path_final = path
-
-        with open(path_final, "rb") as f:
-            data = pickle.load(f)
-
-        for f in {path, path_decrypted}:
-            thread(delete_file, (f,))
+        data = file_to_data(path, decrypt)
+        thread(delete_file, (path,))
     except Exception as e:
         logger.warning(f"Receive file error: {e}", exc_info=True)
 
@@ -443,7 +431,7 @@ def receive_leave_approve(client: Client, data: dict) -> bool:
             text += f"{lang('reason')}{lang('colon')}{code(reason)}\n"
 
         leave_group(client, the_id)
-        thread(send_message, (client, glovar.debug_channel_id, text))
+        thread(send_message, (client, glovar.debug_channel_id, text), "log")
 
         return True
     except Exception as e:
@@ -521,7 +509,7 @@ def receive_refresh(client: Client, data: int) -> bool:
         text = (f"{lang('project')}{lang('colon')}{general_link(glovar.project_name, glovar.project_link)}\n"
                 f"{lang('admin_project')}{lang('colon')}{mention_id(aid)}\n"
                 f"{lang('action')}{lang('colon')}{code(lang('refresh'))}\n")
-        thread(send_message, (client, glovar.debug_channel_id, text))
+        thread(send_message, (client, glovar.debug_channel_id, text), "log")
 
         return True
     except Exception as e:
@@ -545,42 +533,43 @@ def receive_regex(client: Client, message: Message, data: str) -> bool:
         if words_data is None:
             return True
 
-        pop_set = set(eval(f"glovar.{file_name}")) - set(words_data)
-        new_set = set(words_data) - set(eval(f"glovar.{file_name}"))
+        words = glovar.words[word_type]
+        pop_set = set(words) - set(words_data)
+        new_set = set(words_data) - set(words)
 
         for word in pop_set:
-            eval(f"glovar.{file_name}").pop(word, 0)
+            words.pop(word, 0)
 
         for word in new_set:
-            eval(f"glovar.{file_name}")[word] = 0
+            words[word] = 0
 
+        compile_regex(word_type)
         save(file_name)
 
         # Regenerate special characters dictionary if possible
         if file_name in {"spc_words", "spe_words"}:
-            special = file_name.split("_")[0]
-            exec(f"glovar.{special}_dict = {{}}")
+            compile_special(word_type, words_data)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Receive regex error: {e}", exc_info=True)
+    finally:
+        glovar.locks["regex"].release()
 
-            for rule in words_data:
-                # Check keys
-                if "[" not in rule:
-                    continue
+    return False
 
-                # Check value
-                if "?#" not in rule:
-                    continue
 
-                keys = rule.split("]")[0][1:]
-                value = rule.split("?#")[1][1]
+def receive_regex_count(client: Client, data: str) -> bool:
+    # Receive the request of the regex rules' usage count
+    try:
+        if data != "ask":
+            return True
 
-                for k in keys:
-                    eval(f"glovar.{special}_dict")[k] = value
+        send_count(client)
 
         return True
     except Exception as e:
-        logger.warning(f"Receive regex error: {e}", exc_info=True)
-    finally:
-        glovar.locks["regex"].release()
+        logger.warning(f"Receive regex count error: {e}", exc_info=True)
 
     return False
 
@@ -595,17 +584,18 @@ def receive_remove_bad(data: dict) -> bool:
         # Remove bad channel
         if the_type == "channel":
             glovar.bad_ids["channels"].discard(the_id)
+            journal("bad_ids", "discard", ("channels",), the_id)
 
         # Remove bad user
         if the_type == "user":
             glovar.bad_ids["users"].discard(the_id)
+            journal("bad_ids", "discard", ("users",), the_id)
             glovar.watch_ids["ban"].pop(the_id, {})
+            journal("watch_ids", "pop", ("ban", the_id))
             glovar.watch_ids["delete"].pop(the_id, {})
-            save("watch_ids")
+            journal("watch_ids", "pop", ("delete", the_id))
             glovar.user_ids[the_id] = deepcopy(glovar.default_user_status)
-            save("user_ids")
-
-        save("bad_ids")
+            journal("user_ids", "set", (the_id,), deepcopy(glovar.default_user_status))
 
         return True
     except Exception as e:
@@ -681,7 +671,7 @@ def receive_remove_score(data: int) -> bool:
             return True
 
         glovar.user_ids[uid] = deepcopy(glovar.default_user_status)
-        save("user_ids")
+        journal("user_ids", "set", (uid,), deepcopy(glovar.default_user_status))
 
         return True
     except Exception as e:
@@ -700,8 +690,9 @@ def receive_remove_watch(data: int) -> bool:
 
         # Reset watch status
         glovar.watch_ids["ban"].pop(uid, 0)
+        journal("watch_ids", "pop", ("ban", uid))
         glovar.watch_ids["delete"].pop(uid, 0)
-        save("watch_ids")
+        journal("watch_ids", "pop", ("delete", uid))
 
         return True
     except Exception as e:
@@ -721,15 +712,40 @@ def receive_rollback(client: Client, message: Message, data: dict) -> bool:
         if not the_data:
             return True
 
-        exec(f"glovar.{the_type} = the_data")
+        if glovar.database and the_type in glovar.journal_list:
+            load_data(eval(f"glovar.{the_type}"), the_data)
+        elif the_type == "user_ids":
+            glovar.user_ids = UserDict(the_data)
+        else:
+            exec(f"glovar.{the_type} = the_data")
+
         save(the_type)
 
+        # Rebuild the reverse index of the trust lists
+        if the_type == "trust_ids":
+            reset_trusted_ids()
+
+        # Recompile the configs of the groups
+        if the_type == "configs":
+            reset_policies()
+
+        # Refresh the regex rules registry
+        if the_type in {f"{word_type}_words" for word_type in glovar.regex}:
+            word_type = the_type.split("_")[0]
+
+            with glovar.locks["regex"]:
+                glovar.words[word_type] = the_data
+                compile_regex(word_type)
+
+                if word_type in {"spc", "spe"}:
+                    compile_special(word_type, the_data)
+
         # Send debug message
         text = (f"{lang('project')}{lang('colon')}{general_link(glovar.project_name, glovar.project_link)}\n"
                 f"{lang('admin_project')}{lang('colon')}{mention_id(aid)}\n"
                 f"{lang('action')}{lang('colon')}{code(lang('rollback'))}\n"
                 f"{lang('more')}{lang('colon')}{code(the_type)}\n")
-        thread(send_message, (client, glovar.debug_channel_id, text))
+        thread(send_message, (client, glovar.debug_channel_id, text), "log")
     except Exception as e:
         logger.warning(f"Receive rollback error: {e}", exc_info=True)
 
@@ -765,7 +781,7 @@ def receive_user_score(project: str, data: dict) -> bool:
 
         score = data["score"]
         glovar.user_ids[uid]["score"][project] = score
-        save("user_ids")
+        journal("user_ids", "set", (uid, "score", project), score)
 
         return True
     except Exception as e:
@@ -789,14 +805,11 @@ def receive_watch_user(data: dict) -> bool:
         until = get_int(until)
 
         # Add to list
-        if the_type == "ban":
-            glovar.watch_ids["ban"][uid] = until
-        elif the_type == "delete":
-            glovar.watch_ids["delete"][uid] = until
-        else:
+        if the_type not in {"ban", "delete"}:
             return False
 
-        save("watch_ids")
+        glovar.watch_ids[the_type][uid] = until
+        journal("watch_ids", "set", (the_type, uid), until)
 
         return True
     except Exception as e:
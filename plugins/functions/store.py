@@ -0,0 +1,669 @@
+# SCP-079-LANG - Ban or delete by detecting the language
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-LANG.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import sqlite3
+from array import array
+from collections import OrderedDict
+from copy import deepcopy
+from threading import RLock
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# The lock of the users' compact status, the arrays are replaced as a whole under it so readers never see a half update
+status_lock: RLock = RLock()
+
+# The schema of the database, the glovar data are stored as rows
+schema: List[str] = [
+    "CREATE TABLE IF NOT EXISTS users (uid INTEGER PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS user_join "
+    "(uid INTEGER, gid INTEGER, time INTEGER, PRIMARY KEY (uid, gid)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS user_join_time ON user_join (time)",
+    "CREATE TABLE IF NOT EXISTS user_detected "
+    "(uid INTEGER, gid INTEGER, time INTEGER, PRIMARY KEY (uid, gid)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS user_score "
+    "(uid INTEGER, project TEXT, score REAL, PRIMARY KEY (uid, project)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS watch "
+    "(type TEXT, uid INTEGER, until INTEGER, PRIMARY KEY (type, uid)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS bad (type TEXT, id INTEGER, PRIMARY KEY (type, id)) WITHOUT ROWID",
+    "DROP INDEX IF EXISTS user_detected_time",
+    "DROP INDEX IF EXISTS watch_until"
+]
+
+
+class GroupTimes:
+    # The dict-like view of a user's join or detected times, stored as an array of [gid, time, gid, time, ...]
+    __slots__ = ("status", "field")
+
+    def __init__(self, status: "UserStatus", field: str):
+        self.status = status
+        self.field = field
+
+    def __contains__(self, gid: int) -> bool:
+        return self.index(gid) >= 0
+
+    def __getitem__(self, gid: int) -> int:
+        data = getattr(self.status, self.field)
+        i = self.find(data, gid)
+
+        if i < 0:
+            raise KeyError(gid)
+
+        return data[i + 1]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        data = getattr(self.status, self.field)
+        return data and len(data) // 2 or 0
+
+    def __setitem__(self, gid: int, time: int):
+        with status_lock:
+            data = array("q", getattr(self.status, self.field) or [])
+            i = self.find(data, gid)
+
+            if i >= 0:
+                data[i + 1] = time
+            else:
+                data.extend([gid, time])
+
+            setattr(self.status, self.field, data)
+
+    def clear(self) -> bool:
+        with status_lock:
+            setattr(self.status, self.field, None)
+
+        return True
+
+    @staticmethod
+    def find(data: Optional[array], gid: int) -> int:
+        # Get the position of the group in the array, -1 if not found
+        if not data:
+            return -1
+
+        for i in range(0, len(data), 2):
+            if data[i] == gid:
+                return i
+
+        return -1
+
+    def get(self, gid: int, default: Any = None) -> Any:
+        data = getattr(self.status, self.field)
+        i = self.find(data, gid)
+
+        if i < 0:
+            return default
+
+        return data[i + 1]
+
+    def index(self, gid: int) -> int:
+        # Get the position of the group in the array, -1 if not found
+        return self.find(getattr(self.status, self.field), gid)
+
+    def items(self) -> List[Tuple[int, int]]:
+        data = getattr(self.status, self.field)
+        return data and list(zip(data[0::2], data[1::2])) or []
+
+    def keys(self) -> List[int]:
+        data = getattr(self.status, self.field)
+        return data and list(data[0::2]) or []
+
+    def pop(self, gid: int, *default: Any) -> Any:
+        with status_lock:
+            data = array("q", getattr(self.status, self.field) or [])
+            i = self.find(data, gid)
+
+            if i < 0 and default:
+                return default[0]
+            elif i < 0:
+                raise KeyError(gid)
+
+            result = data[i + 1]
+            del data[i:i + 2]
+            setattr(self.status, self.field, data or None)
+
+        return result
+
+    def values(self) -> List[int]:
+        data = getattr(self.status, self.field)
+        return data and list(data[1::2]) or []
+
+
+class Scores:
+    # The dict-like view of a user's scores, the projects' scores are stored as an array of floats
+    __slots__ = ("status",)
+
+    def __init__(self, status: "UserStatus"):
+        self.status = status
+
+    def __contains__(self, project: str) -> bool:
+        return project in UserStatus.projects or project in (self.status.extra or {})
+
+    def __getitem__(self, project: str) -> float:
+        if project not in UserStatus.projects:
+            return (self.status.extra or {})[project]
+
+        if self.status.score is None:
+            return 0.0
+
+        return self.status.score[UserStatus.projects.index(project)]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def __setitem__(self, project: str, score: float):
+        with status_lock:
+            if project not in UserStatus.projects:
+                self.status.extra = self.status.extra or {}
+                self.status.extra[project] = score
+                return
+
+            if self.status.score is None and not score:
+                return
+
+            if self.status.score is None:
+                self.status.score = array("d", [0.0] * len(UserStatus.projects))
+
+            self.status.score[UserStatus.projects.index(project)] = score
+
+    def get(self, project: str, default: Any = None) -> Any:
+        if project not in self:
+            return default
+
+        return self[project]
+
+    def items(self) -> List[Tuple[str, float]]:
+        return list(zip(self.keys(), self.values()))
+
+    def keys(self) -> List[str]:
+        return list(UserStatus.projects) + list(self.status.extra or {})
+
+    def values(self) -> List[float]:
+        scores = list(self.status.score or [0.0] * len(UserStatus.projects))
+        return scores + list((self.status.extra or {}).values())
+
+
+class UserStatus:
+    # The compact status of a user, it can be used as the dict of glovar.default_user_status
+    __slots__ = ("detected", "join", "score", "extra")
+
+    # The projects which have a fixed position in the score array
+    projects: Tuple[str, ...] = ()
+
+    fields: Tuple[str, ...] = ("detected", "join", "score")
+
+    def __init__(self, status: dict = None):
+        self.detected = None
+        self.join = None
+        self.score = None
+        self.extra = None
+
+        if not status:
+            return
+
+        for field in self.fields:
+            if field not in status:
+                continue
+
+            self[field] = status[field]
+
+    def __contains__(self, field: str) -> bool:
+        return field in self.fields
+
+    def __deepcopy__(self, memo: dict) -> "UserStatus":
+        result = UserStatus()
+        result.__setstate__(deepcopy(self.__getstate__(), memo))
+
+        return result
+
+    def __getitem__(self, field: str) -> Any:
+        if field == "score":
+            return Scores(self)
+        elif field in {"detected", "join"}:
+            return GroupTimes(self, field)
+
+        raise KeyError(field)
+
+    def __getstate__(self) -> tuple:
+        return self.detected, self.join, self.score, self.extra
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.fields)
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def __setitem__(self, field: str, value: dict):
+        view = self[field]
+
+        with status_lock:
+            if field == "score":
+                self.score = None
+                self.extra = None
+            else:
+                view.clear()
+
+            for key in value:
+                view[key] = value[key]
+
+    def __setstate__(self, state: tuple):
+        self.detected, self.join, self.score, self.extra = state
+
+    def get(self, field: str, default: Any = None) -> Any:
+        if field not in self.fields:
+            return default
+
+        return self[field]
+
+    def items(self) -> List[tuple]:
+        return [(field, self[field]) for field in self.fields]
+
+    def keys(self) -> List[str]:
+        return list(self.fields)
+
+    def values(self) -> list:
+        return [self[field] for field in self.fields]
+
+
+class UserDict(dict):
+    # The dict of user_ids, the users' status are stored as UserStatus
+
+    def __init__(self, data: dict = None):
+        super().__init__()
+        data and self.update(data)
+
+    def __setitem__(self, uid: int, status: Any):
+        if not isinstance(status, UserStatus):
+            status = UserStatus(status)
+
+        super().__setitem__(uid, status)
+
+    def clear_join(self) -> bool:
+        # Forget all the join records
+        for status in list(self.values()):
+            status.join = None
+
+        return True
+
+    def joined(self, since: int) -> Dict[int, UserStatus]:
+        # Get the users who joined any group after the time
+        result = {}
+
+        for uid, status in list(self.items()):
+            if not status.join or not any(time > since for time in status.join[1::2]):
+                continue
+
+            result[uid] = deepcopy(status)
+
+        return result
+
+    def update(self, data: dict):
+        for uid in data:
+            self[uid] = data[uid]
+
+
+class Database:
+    # The SQLite database of user_ids, watch_ids and bad_ids
+
+    def __init__(self, path: str):
+        self.lock = RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+
+        for sql in schema:
+            self.conn.execute(sql)
+
+        self.conn.commit()
+
+    def commit(self) -> bool:
+        # Commit the pending changes, called by the persistence writer
+        with self.lock:
+            self.conn.commit()
+
+        return True
+
+    def execute(self, sql: str, parameters: tuple = ()) -> List[tuple]:
+        # Execute a statement and fetch all the rows
+        with self.lock:
+            return self.conn.execute(sql, parameters).fetchall()
+
+    def executemany(self, sql: str, parameters: list) -> bool:
+        # Execute a statement for all the parameters
+        with self.lock:
+            self.conn.executemany(sql, parameters)
+
+        return True
+
+    def is_empty(self) -> bool:
+        # Check if nothing has been stored in the database
+        return not any(self.execute(f"SELECT 1 FROM {table} LIMIT 1") for table in ["users", "watch", "bad"])
+
+
+class UserMap:
+    # The dict-like view of user_ids, with a cache of the recently used users in front
+
+    def __init__(self, db: Database, default: dict, size: int):
+        self.db = db
+        self.default = default
+        self.size = size
+        self.cache = OrderedDict()
+
+    def __contains__(self, uid: int) -> bool:
+        return self.get(uid) is not None
+
+    def __delitem__(self, uid: int):
+        if self.pop(uid, None) is None:
+            raise KeyError(uid)
+
+    def __getitem__(self, uid: int) -> dict:
+        result = self.get(uid)
+
+        if result is None:
+            raise KeyError(uid)
+
+        return result
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([row[0] for row in self.db.execute("SELECT uid FROM users")])
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM users")[0][0]
+
+    def __reduce__(self):
+        # Pickle as a plain dict, so the backup files are the same as the ones without the database
+        return dict, (dict(self.items()),)
+
+    def __setitem__(self, uid: int, status: dict):
+        with self.db.lock:
+            self.delete(uid)
+            self.db.execute("INSERT INTO users (uid) VALUES (?)", (uid,))
+
+            for table in ["join", "detected"]:
+                self.db.executemany(f"INSERT INTO user_{table} (uid, gid, time) VALUES (?, ?, ?)",
+                                    [(uid, gid, status[table][gid]) for gid in status.get(table, {})])
+
+            self.db.executemany("INSERT INTO user_score (uid, project, score) VALUES (?, ?, ?)",
+                                [(uid, project, score) for project, score in status.get("score", {}).items()
+                                 if score])
+
+            self.remember(uid, status)
+
+    def apply(self, op: str, keys: tuple, value: Any = None) -> bool:
+        # Apply a journal record of a nested field, the cached status is already changed by the caller
+        if len(keys) != 3:
+            return True
+
+        uid, field, key = keys
+
+        with self.db.lock:
+            if field == "score":
+                self.db.execute("DELETE FROM user_score WHERE uid = ? AND project = ?", (uid, key))
+
+                if op == "set" and value:
+                    self.db.execute("INSERT INTO user_score (uid, project, score) VALUES (?, ?, ?)", (uid, key, value))
+            elif field in {"detected", "join"}:
+                self.db.execute(f"DELETE FROM user_{field} WHERE uid = ? AND gid = ?", (uid, key))
+
+                if op == "set":
+                    self.db.execute(f"INSERT INTO user_{field} (uid, gid, time) VALUES (?, ?, ?)", (uid, key, value))
+
+        return True
+
+    def clear(self) -> bool:
+        with self.db.lock:
+            for table in ["users", "user_join", "user_detected", "user_score"]:
+                self.db.execute(f"DELETE FROM {table}")
+
+            self.cache.clear()
+
+        return True
+
+    def clear_join(self) -> bool:
+        # Forget all the join records
+        with self.db.lock:
+            self.db.execute("DELETE FROM user_join")
+
+            for status in self.cache.values():
+                if status is None:
+                    continue
+
+                status["join"].clear()
+
+        return True
+
+    def delete(self, uid: int) -> bool:
+        # Delete the user's rows
+        with self.db.lock:
+            for table in ["users", "user_join", "user_detected", "user_score"]:
+                self.db.execute(f"DELETE FROM {table} WHERE uid = ?", (uid,))
+
+            self.cache.pop(uid, None)
+
+        return True
+
+    def get(self, uid: int, default: Any = None) -> Any:
+        with self.db.lock:
+            if uid in self.cache:
+                self.cache.move_to_end(uid)
+                status = self.cache[uid]
+            else:
+                status = self.load(uid)
+                self.remember(uid, status)
+
+        if status is None:
+            return default
+
+        return status
+
+    def items(self) -> List[tuple]:
+        # Get all the users by scanning the tables, the cache is left untouched
+        result = {uid: deepcopy(self.default) for uid in self}
+
+        for table in ["join", "detected"]:
+            for uid, gid, time in self.db.execute(f"SELECT uid, gid, time FROM user_{table}"):
+                if uid not in result:
+                    continue
+
+                result[uid][table][gid] = time
+
+        for uid, project, score in self.db.execute("SELECT uid, project, score FROM user_score"):
+            if uid not in result:
+                continue
+
+            result[uid]["score"][project] = score
+
+        return list(result.items())
+
+    def joined(self, since: int) -> Dict[int, dict]:
+        # Get the users who joined any group after the time, by the index of the join time
+        result = {}
+
+        for uid, in self.db.execute("SELECT DISTINCT uid FROM user_join WHERE time > ?", (since,)):
+            status = self.get(uid)
+
+            if status is None:
+                continue
+
+            result[uid] = deepcopy(status)
+
+        return result
+
+    def load(self, uid: int) -> Optional[dict]:
+        # Load the user's status from the rows
+        if not self.db.execute("SELECT 1 FROM users WHERE uid = ?", (uid,)):
+            return None
+
+        status = deepcopy(self.default)
+
+        for table in ["join", "detected"]:
+            rows = self.db.execute(f"SELECT gid, time FROM user_{table} WHERE uid = ?", (uid,))
+            status[table] = {gid: time for gid, time in rows}
+
+        for project, score in self.db.execute("SELECT project, score FROM user_score WHERE uid = ?", (uid,)):
+            status["score"][project] = score
+
+        return status
+
+    def pop(self, uid: int, default: Any = None) -> Any:
+        with self.db.lock:
+            status = self.get(uid)
+
+            if status is None:
+                return default
+
+            self.delete(uid)
+
+        return status
+
+    def remember(self, uid: int, status: Optional[dict]) -> bool:
+        # Put the status in the cache, the unknown users are cached as None
+        self.cache[uid] = status
+        self.cache.move_to_end(uid)
+
+        while len(self.cache) > self.size:
+            self.cache.popitem(last=False)
+
+        return True
+
+
+class WatchMap:
+    # The dict-like view of a watch type in watch_ids
+
+    def __init__(self, db: Database, the_type: str):
+        self.db = db
+        self.type = the_type
+
+    def __contains__(self, uid: int) -> bool:
+        return self.get(uid) is not None
+
+    def __getitem__(self, uid: int) -> int:
+        result = self.get(uid)
+
+        if result is None:
+            raise KeyError(uid)
+
+        return result
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([row[0] for row in self.db.execute("SELECT uid FROM watch WHERE type = ?", (self.type,))])
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM watch WHERE type = ?", (self.type,))[0][0]
+
+    def __reduce__(self):
+        return dict, (dict(self.items()),)
+
+    def __setitem__(self, uid: int, until: int):
+        self.db.execute("INSERT OR REPLACE INTO watch (type, uid, until) VALUES (?, ?, ?)", (self.type, uid, until))
+
+    def clear(self) -> bool:
+        self.db.execute("DELETE FROM watch WHERE type = ?", (self.type,))
+        return True
+
+    def get(self, uid: int, default: Any = None) -> Any:
+        rows = self.db.execute("SELECT until FROM watch WHERE type = ? AND uid = ?", (self.type, uid))
+
+        if not rows:
+            return default
+
+        return rows[0][0]
+
+    def items(self) -> List[tuple]:
+        return self.db.execute("SELECT uid, until FROM watch WHERE type = ?", (self.type,))
+
+    def pop(self, uid: int, default: Any = None) -> Any:
+        with self.db.lock:
+            result = self.get(uid, default)
+            self.db.execute("DELETE FROM watch WHERE type = ? AND uid = ?", (self.type, uid))
+
+        return result
+
+
+class BadSet:
+    # The set-like view of a type in bad_ids
+
+    def __init__(self, db: Database, the_type: str):
+        self.db = db
+        self.type = the_type
+
+    def __contains__(self, the_id: int) -> bool:
+        return bool(self.db.execute("SELECT 1 FROM bad WHERE type = ? AND id = ?", (self.type, the_id)))
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([row[0] for row in self.db.execute("SELECT id FROM bad WHERE type = ?", (self.type,))])
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM bad WHERE type = ?", (self.type,))[0][0]
+
+    def __reduce__(self):
+        return set, (list(self),)
+
+    def add(self, the_id: int) -> bool:
+        self.db.execute("INSERT OR IGNORE INTO bad (type, id) VALUES (?, ?)", (self.type, the_id))
+        return True
+
+    def clear(self) -> bool:
+        self.db.execute("DELETE FROM bad WHERE type = ?", (self.type,))
+        return True
+
+    def discard(self, the_id: int) -> bool:
+        self.db.execute("DELETE FROM bad WHERE type = ? AND id = ?", (self.type, the_id))
+        return True
+
+
+def load_data(target: Any, data: Any) -> bool:
+    # Load the plain data of a glovar variable into its views, used by migration and rollback
+    try:
+        if isinstance(target, UserMap):
+            with target.db.lock:
+                target.clear()
+
+                for uid in data:
+                    target[uid] = data[uid]
+
+                target.cache.clear()
+                target.db.commit()
+
+            return True
+
+        for the_type in target:
+            view = target[the_type]
+
+            with view.db.lock:
+                view.clear()
+
+                for the_id in data.get(the_type, []):
+                    if isinstance(view, BadSet):
+                        view.add(the_id)
+                    else:
+                        view[the_id] = data[the_type][the_id]
+
+                view.db.commit()
+
+        return True
+    except Exception as e:
+        logger.warning(f"Load data error: {e}", exc_info=True)
+
+    return False
@@ -28,7 +28,7 @@ from pyrogram.errors import ChatAdminRequired, ButtonDataInvalid, ChannelInvalid
 from pyrogram.errors import MessageDeleteForbidden, PeerIdInvalid, UsernameInvalid, UsernameNotOccupied
 
 from .. import glovar
-from .etc import delay, t2t, wait_flood
+from .etc import delay, get_priority, rate_limit, t2t, wait_flood
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -46,11 +46,12 @@ def delete_messages(client: Client, cid: int, mids: Iterable[int]) -> Optional[b
                 flood_wait = True
                 while flood_wait:
                     flood_wait = False
+                    rate_limit(cid, "enforce", "delete_messages")
                     try:
                         result = client.delete_messages(chat_id=cid, message_ids=mids)
                     except FloodWait as e:
                         flood_wait = True
-                        wait_flood(e)
+                        wait_flood(e, cid, "delete_messages")
             except MessageDeleteForbidden:
                 return False
             except Exception as e:
@@ -68,11 +69,12 @@ def download_media(client: Client, file_id: str, file_ref: str, file_path: str)
         flood_wait = True
         while flood_wait:
             flood_wait = False
+            rate_limit(method="download_media")
             try:
                 result = client.download_media(message=file_id, file_ref=file_ref, file_name=file_path)
             except FloodWait as e:
                 flood_wait = True
-                wait_flood(e)
+                wait_flood(e, 0, "download_media")
     except Exception as e:
         logger.warning(f"Download media {file_id} to {file_path} error: {e}", exc_info=True)
 
@@ -86,11 +88,12 @@ def get_admins(client: Client, cid: int) -> Union[bool, List[ChatMember], None]:
         flood_wait = True
         while flood_wait:
             flood_wait = False
+            rate_limit(method="get_admins")
             try:
                 result = client.get_chat_members(chat_id=cid, filter="administrators")
             except FloodWait as e:
                 flood_wait = True
-                wait_flood(e)
+                wait_flood(e, 0, "get_admins")
             except (PeerIdInvalid, ChannelInvalid, ChannelPrivate):
                 return False
     except Exception as e:
@@ -106,11 +109,12 @@ def get_chat(client: Client, cid: Union[int, str]) -> Union[Chat, ChatPreview, N
         flood_wait = True
         while flood_wait:
             flood_wait = False
+            rate_limit(method="get_chat")
             try:
                 result = client.get_chat(chat_id=cid)
             except FloodWait as e:
                 flood_wait = True
-                wait_flood(e)
+                wait_flood(e, 0, "get_chat")
             except (PeerIdInvalid, ChannelInvalid, ChannelPrivate):
                 return None
     except Exception as e:
@@ -158,11 +162,12 @@ def get_messages(client: Client, cid: int, mids: Union[int, Iterable[int]]) -> U
         flood_wait = True
         while flood_wait:
             flood_wait = False
+            rate_limit(method="get_messages")
             try:
                 result = client.get_messages(chat_id=cid, message_ids=mids)
             except FloodWait as e:
                 flood_wait = True
-                wait_flood(e)
+                wait_flood(e, 0, "get_messages")
     except Exception as e:
         logger.warning(f"Get messages {mids} in {cid} error: {e}", exc_info=True)
 
@@ -184,6 +189,7 @@ def get_sticker_title(client: Client, short_name: str, normal: bool = False, pri
         flood_wait = True
         while flood_wait:
             flood_wait = False
+            rate_limit(method="get_sticker_title")
             try:
                 the_set = client.send(GetStickerSet(stickerset=sticker_set))
 
@@ -194,7 +200,7 @@ def get_sticker_title(client: Client, short_name: str, normal: bool = False, pri
                         result = t2t(inner_set.title, normal, printable)
             except FloodWait as e:
                 flood_wait = True
-                wait_flood(e)
+                wait_flood(e, 0, "get_sticker_title")
 
         glovar.sticker_titles[short_name] = result
     except Exception as e:
@@ -215,6 +221,7 @@ def get_user_bio(client: Client, uid: int, normal: bool = False, printable: bool
         flood_wait = True
         while flood_wait:
             flood_wait = False
+            rate_limit(method="get_user_bio")
             try:
                 user: UserFull = client.send(GetFullUser(id=user_id))
 
@@ -222,7 +229,7 @@ def get_user_bio(client: Client, uid: int, normal: bool = False, printable: bool
                     result = t2t(user.about, normal, printable)
             except FloodWait as e:
                 flood_wait = True
-                wait_flood(e)
+                wait_flood(e, 0, "get_user_bio")
     except Exception as e:
         logger.warning(f"Get user {uid} bio error: {e}", exc_info=True)
 
@@ -236,11 +243,12 @@ def get_users(client: Client, uids: Iterable[Union[int, str]]) -> Optional[List[
         flood_wait = True
         while flood_wait:
             flood_wait = False
+            rate_limit(method="get_users")
             try:
                 result = client.get_users(user_ids=uids)
             except FloodWait as e:
                 flood_wait = True
-                wait_flood(e)
+                wait_flood(e, 0, "get_users")
             except PeerIdInvalid:
                 return None
     except Exception as e:
@@ -256,11 +264,12 @@ def kick_chat_member(client: Client, cid: int, uid: Union[int, str]) -> Union[bo
         flood_wait = True
         while flood_wait:
             flood_wait = False
+            rate_limit(cid, "enforce", "kick_chat_member")
             try:
                 result = client.kick_chat_member(chat_id=cid, user_id=uid)
             except FloodWait as e:
                 flood_wait = True
-                wait_flood(e)
+                wait_flood(e, cid, "kick_chat_member")
     except Exception as e:
         logger.warning(f"Kick chat member {uid} in {cid} error: {e}", exc_info=True)
 
@@ -273,11 +282,12 @@ def leave_chat(client: Client, cid: int, delete: bool = False) -> bool:
         flood_wait = True
         while flood_wait:
             flood_wait = False
+            rate_limit(cid, "enforce", "leave_chat")
             try:
                 client.leave_chat(chat_id=cid, delete=delete)
             except FloodWait as e:
                 flood_wait = True
-                wait_flood(e)
+                wait_flood(e, cid, "leave_chat")
             except (PeerIdInvalid, ChannelInvalid, ChannelPrivate):
                 return False
 
@@ -295,11 +305,12 @@ def resolve_peer(client: Client, pid: Union[int, str]) -> Union[bool, InputPeerC
         flood_wait = True
         while flood_wait:
             flood_wait = False
+            rate_limit(method="resolve_peer")
             try:
                 result = client.resolve_peer(pid)
             except FloodWait as e:
                 flood_wait = True
-                wait_flood(e)
+                wait_flood(e, 0, "resolve_peer")
             except (PeerIdInvalid, UsernameInvalid, UsernameNotOccupied):
                 return False
     except Exception as e:
@@ -316,6 +327,7 @@ def restrict_chat_member(client: Client, cid: int, uid: int, permissions: ChatPe
         flood_wait = True
         while flood_wait:
             flood_wait = False
+            rate_limit(cid, "enforce", "restrict_chat_member")
             try:
                 result = client.restrict_chat_member(
                     chat_id=cid,
@@ -325,7 +337,7 @@ def restrict_chat_member(client: Client, cid: int, uid: int, permissions: ChatPe
                 )
             except FloodWait as e:
                 flood_wait = True
-                wait_flood(e)
+                wait_flood(e, cid, "restrict_chat_member")
     except Exception as e:
         logger.warning(f"Restrict chat member {uid} in {cid} error: {e}", exc_info=True)
 
@@ -340,6 +352,7 @@ def send_document(client: Client, cid: int, document: str, file_ref: str = None,
         flood_wait = True
         while flood_wait:
             flood_wait = False
+            rate_limit(cid, get_priority(cid), "send_document")
             try:
                 result = client.send_document(
                     chat_id=cid,
@@ -352,7 +365,7 @@ def send_document(client: Client, cid: int, document: str, file_ref: str = None,
                 )
             except FloodWait as e:
                 flood_wait = True
-                wait_flood(e)
+                wait_flood(e, cid, "send_document")
             except ButtonDataInvalid:
                 logger.warning(f"Send document {document} to {cid} - invalid markup: {markup}")
             except (ChatAdminRequired, PeerIdInvalid, ChannelInvalid, ChannelPrivate):
@@ -374,6 +387,7 @@ def send_message(client: Client, cid: int, text: str, mid: int = None,
         flood_wait = True
         while flood_wait:
             flood_wait = False
+            rate_limit(cid, get_priority(cid), "send_message")
             try:
                 result = client.send_message(
                     chat_id=cid,
@@ -385,7 +399,7 @@ def send_message(client: Client, cid: int, text: str, mid: int = None,
                 )
             except FloodWait as e:
                 flood_wait = True
-                wait_flood(e)
+                wait_flood(e, cid, "send_message")
             except ButtonDataInvalid:
                 logger.warning(f"Send message to {cid} - invalid markup: {markup}")
             except (ChatAdminRequired, PeerIdInvalid, ChannelInvalid, ChannelPrivate):
@@ -407,6 +421,7 @@ def send_report_message(secs: int, client: Client, cid: int, text: str, mid: int
         flood_wait = True
         while flood_wait:
             flood_wait = False
+            rate_limit(cid, get_priority(cid), "send_message")
             try:
                 result = client.send_message(
                     chat_id=cid,
@@ -418,7 +433,7 @@ def send_report_message(secs: int, client: Client, cid: int, text: str, mid: int
                 )
             except FloodWait as e:
                 flood_wait = True
-                wait_flood(e)
+                wait_flood(e, cid, "send_message")
             except ButtonDataInvalid:
                 logger.warning(f"Send report message to {cid} - invalid markup: {markup}")
 
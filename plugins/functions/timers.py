@@ -17,7 +17,6 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-from copy import deepcopy
 from time import sleep
 
 from pyrogram import Client
@@ -25,9 +24,10 @@ from pyrogram import Client
 from .. import glovar
 from .channel import ask_for_help, get_debug_text, share_data, share_regex_count
 from .etc import code, general_link, get_full_name, get_now, lang, message_link, thread
-from .file import save
+from .file import save, save_file
 from .filters import is_in_config
 from .group import leave_group
+from .ids import update_trust_ids
 from .telegram import get_admins, get_group_info, send_message
 from .user import ban_user, get_user
 
@@ -43,6 +43,10 @@ def backup_files(client: Client) -> bool:
             if not eval(f"glovar.{file}"):
                 continue
 
+            # Export the data from the database
+            if glovar.database and file in glovar.journal_list:
+                save_file(file)
+
             # Share
             share_data(
                 client=client,
@@ -85,7 +89,7 @@ def interval_min_15(client: Client) -> bool:
         now = get_now()
 
         with glovar.locks["message"]:
-            user_ids = deepcopy(glovar.user_ids)
+            user_ids = glovar.user_ids.joined(now - glovar.time_new)
 
         for uid in user_ids:
             # Do not check banned users
@@ -137,7 +141,7 @@ def interval_min_15(client: Client) -> bool:
                 text += (f"{lang('user_id')}{lang('colon')}{code(uid)}\n"
                          f"{lang('action')}{lang('colon')}{code(lang('name_ban'))}\n"
                          f"{lang('evidence')}{lang('colon')}{general_link(result.message_id, message_link(result))}\n")
-                thread(send_message, (client, glovar.debug_channel_id, text))
+                thread(send_message, (client, glovar.debug_channel_id, text), "log")
 
         return True
     except Exception as e:
@@ -149,25 +153,23 @@ def interval_min_15(client: Client) -> bool:
 def reset_data(client: Client) -> bool:
     # Reset user data every month
     try:
-        glovar.bad_ids["users"] = set()
+        glovar.bad_ids["users"].clear()
         save("bad_ids")
 
         glovar.except_ids["temp"] = set()
         save("except_ids")
 
-        glovar.user_ids = {}
+        glovar.user_ids.clear()
         save("user_ids")
 
-        glovar.watch_ids = {
-            "ban": {},
-            "delete": {}
-        }
+        glovar.watch_ids["ban"].clear()
+        glovar.watch_ids["delete"].clear()
         save("watch_ids")
 
         # Send debug message
         text = (f"{lang('project')}{lang('colon')}{general_link(glovar.project_name, glovar.project_link)}\n"
                 f"{lang('action')}{lang('colon')}{code(lang('reset'))}\n")
-        thread(send_message, (client, glovar.debug_channel_id, text))
+        thread(send_message, (client, glovar.debug_channel_id, text), "log")
 
         return True
     except Exception as e:
@@ -182,10 +184,10 @@ def send_count(client: Client) -> bool:
     try:
         for word_type in glovar.regex:
             share_regex_count(client, word_type)
-            word_list = list(eval(f"glovar.{word_type}_words"))
+            words = glovar.words[word_type]
 
-            for word in word_list:
-                eval(f"glovar.{word_type}_words")[word] = 0
+            for word in list(words):
+                words[word] = 0
 
             save(f"{word_type}_words")
 
@@ -220,10 +222,9 @@ def update_admins(client: Client) -> bool:
                 save("admin_ids")
 
                 # Trust list
-                glovar.trust_ids[gid] = {admin.user.id for admin in admin_members
-                                         if ((not admin.user.is_bot and not admin.user.is_deleted)
-                                             or admin.user.id in glovar.bot_ids)}
-                save("trust_ids")
+                update_trust_ids(gid, {admin.user.id for admin in admin_members
+                                       if ((not admin.user.is_bot and not admin.user.is_deleted)
+                                           or admin.user.id in glovar.bot_ids)})
 
                 if glovar.user_id not in glovar.admin_ids[gid]:
                     reason = "user"
@@ -256,7 +257,7 @@ def update_admins(client: Client) -> bool:
                               f"{lang('group_name')}{lang('colon')}{general_link(group_name, group_link)}\n"
                               f"{lang('group_id')}{lang('colon')}{code(gid)}\n"
                               f"{lang('status')}{lang('colon')}{code(reason)}\n")
-                thread(send_message, (client, glovar.debug_channel_id, debug_text))
+                thread(send_message, (client, glovar.debug_channel_id, debug_text), "log")
             elif admin_members is False or any([admin.user.is_self for admin in admin_members]) is False:
                 # Bot is not in the chat, leave automatically without approve
                 group_name, group_link = get_group_info(client, gid)
@@ -278,7 +279,7 @@ def update_admins(client: Client) -> bool:
                               f"{lang('group_id')}{lang('colon')}{code(gid)}\n"
                               f"{lang('status')}{lang('colon')}{code(lang('leave_auto'))}\n"
                               f"{lang('reason')}{lang('colon')}{code(lang('reason_leave'))}\n")
-                thread(send_message, (client, glovar.debug_channel_id, debug_text))
+                thread(send_message, (client, glovar.debug_channel_id, debug_text), "log")
 
         return True
     except Exception as e:
@@ -22,10 +22,10 @@ from typing import Optional, Union
 from pyrogram import ChatPermissions, Client, Message, User
 
 from .. import glovar
-from .etc import crypt_str, get_forward_name, get_full_name, get_now, lang, thread
+from .etc import crypt_str, get_forward_name, get_from_name, get_full_name, get_now, lang, thread
 from .channel import ask_for_help, declare_message, forward_evidence, send_debug, share_bad_user
 from .channel import share_watch_user, update_score
-from .file import save
+from .file import journal
 from .group import delete_message
 from .filters import is_class_d, is_declared_message, is_detected_user, is_high_score_user, is_limited_user
 from .filters import is_new_user, is_watch_user, is_wb_text
@@ -44,7 +44,7 @@ def add_bad_user(client: Client, uid: int) -> bool:
             return True
 
         glovar.bad_ids["users"].add(uid)
-        save("bad_ids")
+        journal("bad_ids", "add", ("users",), uid)
         share_bad_user(client, uid)
 
         return True
@@ -60,8 +60,10 @@ def add_detected_user(gid: int, uid: int, now: int) -> bool:
         if not init_user_id(uid):
             return False
 
-        previous = glovar.user_ids[uid]["detected"].get(gid)
-        glovar.user_ids[uid]["detected"][gid] = now
+        with glovar.locks["user"]:
+            previous = glovar.user_ids[uid]["detected"].get(gid)
+            glovar.user_ids[uid]["detected"][gid] = now
+            journal("user_ids", "set", (uid, "detected", gid), now)
 
         return bool(previous)
     except Exception as e:
@@ -75,10 +77,10 @@ def add_watch_user(client: Client, the_type: str, uid: int, now: int) -> bool:
     try:
         until = now + glovar.time_ban
         glovar.watch_ids[the_type][uid] = until
+        journal("watch_ids", "set", (the_type, uid), until)
         until = str(until)
         until = crypt_str("encrypt", until, glovar.key)
         share_watch_user(client, the_type, uid, until)
-        save("watch_ids")
 
         return True
     except Exception as e:
@@ -91,9 +93,9 @@ def ban_user(client: Client, gid: int, uid: Union[int, str]) -> bool:
     # Ban a user
     try:
         if glovar.configs[gid].get("restrict"):
-            thread(restrict_chat_member, (client, gid, uid, ChatPermissions()))
+            thread(restrict_chat_member, (client, gid, uid, ChatPermissions()), "enforce")
         else:
-            thread(kick_chat_member, (client, gid, uid))
+            thread(kick_chat_member, (client, gid, uid), "enforce")
 
         return True
     except Exception as e:
@@ -180,7 +182,11 @@ def terminate_user(client: Client, message: Message, user: User, context: str) -
             return True
 
         if the_lang in glovar.lang_text or the_lang in {"spc", "spe"}:
-            full_name = get_full_name(user, True, True)
+            if user is message.from_user:
+                full_name = get_from_name(message, True, True)
+            else:
+                full_name = get_full_name(user, True, True)
+
             forward_name = get_forward_name(message, True, True)
 
             if ((is_wb_text(full_name, False) or is_wb_text(forward_name, False))
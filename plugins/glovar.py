@@ -18,18 +18,28 @@
 
 import logging
 import pickle
+import re
+from asyncio import AbstractEventLoop, new_event_loop
 from codecs import getdecoder
+from collections import OrderedDict
 from configparser import RawConfigParser
-from os import mkdir
+from itertools import count
+from os import mkdir, remove
 from os.path import exists
+from queue import PriorityQueue
 from shutil import rmtree
 from string import ascii_lowercase
+from sys import maxunicode
 from threading import Lock
-from typing import Dict, List, Set, Union
+from typing import Dict, FrozenSet, List, Optional, Pattern, Set, Tuple, Union
 
 from emoji import UNICODE_EMOJI
+from opencc import OpenCC
 from pyrogram import Chat
 
+from .functions.policy import Policy, get_policy
+from .functions.store import BadSet, Database, UserDict, UserMap, UserStatus, WatchMap, load_data
+
 # Enable logging
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -71,10 +81,14 @@ test_group_id: int = 0
 # [custom]
 aio: Union[bool, str] = ""
 backup: Union[bool, str] = ""
+database: Union[bool, str] = "False"
+database_cache: int = 10000
 date_reset: str = ""
 default_group_link: str = ""
 lang_all: Union[str, Set[str]] = ""
 lang_bio: Union[str, Set[str]] = ""
+lang_cache_size: int = 10000
+lang_cache_time: int = 3600
 lang_name: Union[str, Set[str]] = ""
 lang_protect: Union[str, Set[str]] = ""
 lang_sticker: Union[str, Set[str]] = ""
@@ -82,9 +96,14 @@ lang_text: Union[str, Set[str]] = ""
 limit_track: int = 0
 project_link: str = ""
 project_name: str = ""
+share_batch: Union[bool, str] = "False"
+task_enforce_workers: int = 4
+task_log_workers: int = 2
+task_workers: int = 16
 time_ban: int = 0
 time_new: int = 0
 time_punish: int = 0
+time_save: int = 10
 time_short: int = 0
 time_track: int = 0
 zh_cn: Union[bool, str] = ""
@@ -136,12 +155,17 @@ try:
     aio = eval(aio)
     backup = config["custom"].get("backup", backup)
     backup = eval(backup)
+    database = config["custom"].get("database", database)
+    database = eval(database)
+    database_cache = int(config["custom"].get("database_cache", str(database_cache)))
     date_reset = config["custom"].get("date_reset", date_reset)
     default_group_link = config["custom"].get("default_group_link", default_group_link)
     lang_all = config["custom"].get("lang_all", lang_all)
     lang_all = set(lang_all.split())
     lang_bio = config["custom"].get("lang_bio", lang_bio)
     lang_bio = set(lang_bio.split())
+    lang_cache_size = int(config["custom"].get("lang_cache_size", str(lang_cache_size)))
+    lang_cache_time = int(config["custom"].get("lang_cache_time", str(lang_cache_time)))
     lang_name = config["custom"].get("lang_name", lang_name)
     lang_name = set(lang_name.split())
     lang_protect = config["custom"].get("lang_protect", lang_protect)
@@ -153,9 +177,15 @@ try:
     limit_track = int(config["custom"].get("limit_track", str(limit_track)))
     project_link = config["custom"].get("project_link", project_link)
     project_name = config["custom"].get("project_name", project_name)
+    share_batch = config["custom"].get("share_batch", share_batch)
+    share_batch = eval(share_batch)
+    task_enforce_workers = int(config["custom"].get("task_enforce_workers", str(task_enforce_workers)))
+    task_log_workers = int(config["custom"].get("task_log_workers", str(task_log_workers)))
+    task_workers = int(config["custom"].get("task_workers", str(task_workers)))
     time_ban = int(config["custom"].get("time_ban", str(time_ban)))
     time_new = int(config["custom"].get("time_new", str(time_new)))
     time_punish = int(config["custom"].get("time_punish", str(time_punish)))
+    time_save = int(config["custom"].get("time_save", str(time_save)))
     time_short = int(config["custom"].get("time_short", str(time_short)))
     time_track = int(config["custom"].get("time_track", str(time_track)))
     zh_cn = config["custom"].get("zh_cn", zh_cn)
@@ -199,10 +229,14 @@ if (bot_token in {"", "[DATA EXPUNGED]"}
         or test_group_id == 0
         or aio not in {False, True}
         or backup not in {False, True}
+        or database not in {False, True}
+        or database_cache < 0
         or date_reset in {"", "[DATA EXPUNGED]"}
         or default_group_link in {"", "[DATA EXPUNGED]"}
         or lang_all in {"", "[DATA EXPUNGED]"} or lang_all == set()
         or lang_bio in {"", "[DATA EXPUNGED]"} or lang_bio == set()
+        or lang_cache_size < 0
+        or lang_cache_time < 0
         or lang_name in {"", "[DATA EXPUNGED]"} or lang_name == set()
         or lang_protect in {"", "[DATA EXPUNGED]"} or lang_protect == set()
         or lang_sticker in {"", "[DATA EXPUNGED]"} or lang_sticker == set()
@@ -210,9 +244,14 @@ if (bot_token in {"", "[DATA EXPUNGED]"}
         or limit_track == 0
         or project_link in {"", "[DATA EXPUNGED]"}
         or project_name in {"", "[DATA EXPUNGED]"}
+        or share_batch not in {False, True}
+        or task_enforce_workers <= 0
+        or task_log_workers <= 0
+        or task_workers <= 0
         or time_ban == 0
         or time_new == 0
         or time_punish == 0
+        or time_save <= 0
         or time_short == 0
         or time_track == 0
         or zh_cn not in {False, True}
@@ -356,6 +395,13 @@ lang: Dict[str, str] = {
     # Test
     "record_content": (zh_cn and "过滤记录") or "Recorded content",
     "record_link": (zh_cn and "过滤链接") or "Recorded link",
+    "save_count": (zh_cn and "保存请求 / 写入") or "Save Requests / Writes",
+    "save_time": (zh_cn and "保存耗时") or "Flush Latency",
+    "regex_index": (zh_cn and "正则索引") or "Regex Index",
+    "lang_cache": (zh_cn and "语言缓存 命中 / 未命中") or "Lang Cache Hit / Miss",
+    "lock_wait": (zh_cn and "锁等待 平均 / 最大") or "Lock Wait Avg / Max",
+    "task_queue": (zh_cn and "任务队列 / 完成") or "Task Queue / Done",
+    "task_wait": (zh_cn and "任务等待 平均 / 最大") or "Task Wait Avg / Max",
     "white_listed": (zh_cn and "白名单") or "White Listed"
 }
 
@@ -386,21 +432,56 @@ banned_ids: Set[int] = set()
 bot_ids: Set[int] = {avatar_id, captcha_id, clean_id, lang_id, long_id, noflood_id,
                      noporn_id, nospam_id, tip_id, user_id, warn_id}
 
+chat_locks: Dict[str, List[Lock]] = {
+    "message": [Lock() for _ in range(64)],
+    "text": [Lock() for _ in range(64)]
+}
+
 chats: Dict[int, Chat] = {}
 # chats = {
 #     -10012345678: Chat
 # }
 
+contexts: OrderedDict = OrderedDict()
+# contexts = {
+#     (-10012345678, 123, 0): {
+#         "content": "content",
+#         "text False False": "text"
+#     }
+# }
+
+contexts_size: int = 2000
+
 contents: Dict[str, str] = {}
 # contents = {
 #     "content": "fr"
 # }
 
+convert_cache: OrderedDict = OrderedDict()
+# convert_cache = {
+#     "md5sum0": "text"
+# }
+
+convert_cache_size: int = 10000
+
+# Load the dictionaries of the converter once
+converter: Optional[OpenCC] = (zh_cn and OpenCC("t2s.json")) or None
+
 declared_message_ids: Dict[int, Set[int]] = {}
 # declared_message_ids = {
 #     -10012345678: {123}
 # }
 
+deletions: Dict[int, Set[int]] = {}
+# deletions = {
+#     -10012345678: {123}
+# }
+
+deletions_window: float = 0.2
+
+dirty: Set[str] = set()
+# dirty = {"user_ids"}
+
 default_config: Dict[str, Union[bool, int, Dict[str, Union[bool, List[str], Set[str]]]]] = {
     "default": True,
     "lock": 0,
@@ -448,13 +529,87 @@ default_user_status: Dict[str, Dict[Union[int, str], Union[float, int]]] = {
 
 emoji_set: Set[str] = set(UNICODE_EMOJI)
 
+# emoji_trie = {
+#     "\U0001F468": {
+#         "": "\U0001F468",
+#         "\u200D": {...}
+#     }
+# }
+emoji_trie: Dict[str, dict] = {}
+
+for emoji in emoji_set:
+    node = emoji_trie
+
+    for char in emoji:
+        node = node.setdefault(char, {})
+
+    node[""] = emoji
+
+file_memory: int = 8 * 1024 * 1024
+
+flood_until: Dict[Tuple[str, int], float] = {}
+# flood_until = {
+#     ("send_message", -10012345678): 1512345678.0
+# }
+
+han: Pattern = re.compile("[\u2e80-\u2fdf\u3005\u3007\u3021-\u3029\u3038-\u303b\u3400-\u4dbf\u4e00-\u9fff"
+                          "\uf900-\ufaff\U00020000-\U0003134f]")
+
+lang_cache: OrderedDict = OrderedDict()
+# lang_cache = {
+#     "md5sum0": (1512345678, "fa")
+# }
+
+lang_cache_count: Dict[str, int] = {
+    "hit": 0,
+    "miss": 0
+}
+
+lang_default: FrozenSet[str] = frozenset(lang_bio | lang_name | lang_sticker | lang_text)
+
+journal_limit: int = 100000
+
+journal_list: List[str] = ["bad_ids", "user_ids", "watch_ids"]
+
+journals: Dict[str, List[tuple]] = {}
+# journals = {
+#     "user_ids": [("set", (12345678, "join", -10012345678), 1512345678)]
+# }
+
+journal_count: Dict[str, int] = {}
+# journal_count = {
+#     "user_ids": 0
+# }
+
+journal_seq: Dict[str, int] = {}
+# journal_seq = {
+#     "user_ids": 3
+# }
+
 locks: Dict[str, Lock] = {
     "admin": Lock(),
+    "context": Lock(),
+    "convert": Lock(),
+    "delete": Lock(),
+    "lang": Lock(),
     "message": Lock(),
+    "rate": Lock(),
     "receive": Lock(),
     "regex": Lock(),
+    "save": Lock(),
+    "share": Lock(),
+    "task": Lock(),
     "test": Lock(),
-    "text": Lock()
+    "trust": Lock(),
+    "user": Lock()
+}
+
+loop: AbstractEventLoop = new_event_loop()
+
+lock_count: Dict[str, Union[float, int]] = {
+    "count": 0,
+    "wait": 0.0,
+    "max": 0.0
 }
 
 other_commands: List[str] = [
@@ -470,6 +625,8 @@ other_commands: List[str] = [
     "t2t"
 ]
 
+policy_empty: Policy = Policy()
+
 receivers: Dict[str, List[str]] = {
     "bad": ["ANALYZE", "APPLY", "AVATAR", "CAPTCHA", "CLEAN", "LANG", "LONG", "MANAGE",
             "NOFLOOD", "NOPORN", "NOSPAM", "RECHECK", "TICKET", "TIP", "USER", "WARN", "WATCH"],
@@ -486,6 +643,23 @@ recorded_ids: Dict[int, Set[int]] = {}
 #     -10012345678: {12345678}
 # }
 
+rate_buckets: Dict[int, List[float]] = {}
+# rate_buckets = {
+#     0: [30.0, 1512345678.0],
+#     -10012345678: [20.0, 1512345678.0]
+# }
+
+rate_limits: Dict[str, Tuple[float, int]] = {
+    "chat": (1.0, 20),
+    "global": (30.0, 30)
+}
+
+rate_reserves: Dict[str, float] = {
+    "enforce": 0.0,
+    "normal": 0.2,
+    "log": 0.5
+}
+
 regex: Dict[str, bool] = {
     "ad": False,
     "ban": False,
@@ -506,8 +680,102 @@ regex: Dict[str, bool] = {
 for c in ascii_lowercase:
     regex[f"ad{c}"] = False
 
+ban_types: List[str] = ["ban", "ad", "con", "iml", "pho"] + [f"ad{c}" for c in ascii_lowercase]
+
+wb_types: List[str] = ["wb", "ad", "iml", "pho", "sho", "spc"] + [f"ad{c}" for c in ascii_lowercase if c != "i"]
+
+script_langs: Dict[str, Set[str]] = {
+    "arabic": {"ar", "fa", "ku", "ps", "ug", "ur"},
+    "armenian": {"hy"},
+    "bengali": {"as", "bn"},
+    "cyrillic": {"be", "bg", "kk", "ky", "mk", "mn", "ru", "sr", "uk"},
+    "devanagari": {"hi", "mr", "ne"},
+    "ethiopic": {"am"},
+    "georgian": {"ka"},
+    "greek": {"el"},
+    "gujarati": {"gu"},
+    "gurmukhi": {"pa"},
+    "han": {"ja", "ko", "zh"},
+    "hangul": {"ko"},
+    "hebrew": {"he"},
+    "kana": {"ja"},
+    "kannada": {"kn"},
+    "khmer": {"km"},
+    "lao": {"lo"},
+    "latin": {"af", "an", "az", "br", "bs", "ca", "cs", "cy", "da", "de", "en", "eo", "es", "et", "eu", "fi", "fo",
+              "fr", "ga", "gl", "hr", "ht", "hu", "id", "is", "it", "jv", "ku", "la", "lb", "lt", "lv", "mg", "ms",
+              "mt", "nb", "nl", "nn", "no", "oc", "pl", "pt", "qu", "ro", "rw", "se", "sk", "sl", "so", "sq", "sr",
+              "sv", "sw", "tl", "tr", "vi", "vo", "wa", "xh", "zu"},
+    "malayalam": {"ml"},
+    "oriya": {"or"},
+    "sinhala": {"si"},
+    "tamil": {"ta"},
+    "telugu": {"te"},
+    "thai": {"th"},
+    "tibetan": {"dz"}
+}
+
+script_ranges: List[Tuple[int, int, str]] = [
+    (0x0041, 0x005A, "latin"),
+    (0x0061, 0x007A, "latin"),
+    (0x00C0, 0x024F, "latin"),
+    (0x0370, 0x03FF, "greek"),
+    (0x0400, 0x052F, "cyrillic"),
+    (0x0530, 0x058F, "armenian"),
+    (0x0590, 0x05FF, "hebrew"),
+    (0x0600, 0x06FF, "arabic"),
+    (0x0750, 0x077F, "arabic"),
+    (0x08A0, 0x08FF, "arabic"),
+    (0x0900, 0x097F, "devanagari"),
+    (0x0980, 0x09FF, "bengali"),
+    (0x0A00, 0x0A7F, "gurmukhi"),
+    (0x0A80, 0x0AFF, "gujarati"),
+    (0x0B00, 0x0B7F, "oriya"),
+    (0x0B80, 0x0BFF, "tamil"),
+    (0x0C00, 0x0C7F, "telugu"),
+    (0x0C80, 0x0CFF, "kannada"),
+    (0x0D00, 0x0D7F, "malayalam"),
+    (0x0D80, 0x0DFF, "sinhala"),
+    (0x0E00, 0x0E7F, "thai"),
+    (0x0E80, 0x0EFF, "lao"),
+    (0x0F00, 0x0FFF, "tibetan"),
+    (0x10A0, 0x10FF, "georgian"),
+    (0x1100, 0x11FF, "hangul"),
+    (0x1200, 0x139F, "ethiopic"),
+    (0x1780, 0x17FF, "khmer"),
+    (0x1C90, 0x1CBF, "georgian"),
+    (0x1E00, 0x1EFF, "latin"),
+    (0x2D80, 0x2DDF, "ethiopic"),
+    (0x3040, 0x30FF, "kana"),
+    (0x3130, 0x318F, "hangul"),
+    (0x3400, 0x4DBF, "han"),
+    (0x4E00, 0x9FFF, "han"),
+    (0xAC00, 0xD7AF, "hangul"),
+    (0xF900, 0xFAFF, "han"),
+    (0xFB50, 0xFDFF, "arabic"),
+    (0xFE70, 0xFEFF, "arabic")
+]
+
+script_starts: List[int] = [r[0] for r in script_ranges]
+
+save_count: Dict[str, Union[float, int]] = {
+    "journal": 0,
+    "request": 0,
+    "write": 0,
+    "flush": 0,
+    "time": 0.0,
+    "max": 0.0
+}
+
 sender: str = "LANG"
 
+shares: List[list] = []
+# shares = [[["USER"], "add", "bad", {"id": 12345678, "type": "user"}]]
+
+shares_size: int = 3000
+
+shares_window: float = 1.0
+
 should_hide: bool = False
 
 sticker_titles: Dict[str, str] = {}
@@ -515,6 +783,29 @@ sticker_titles: Dict[str, str] = {}
 #     "short_name": "sticker_title"
 # }
 
+task_count: Dict[str, Union[float, int]] = {
+    "done": 0,
+    "wait": 0.0,
+    "max": 0.0
+}
+
+task_index = count()
+
+task_priorities: Dict[str, int] = {
+    "enforce": 0,
+    "normal": 1,
+    "log": 2
+}
+
+tasks: PriorityQueue = PriorityQueue()
+# tasks = [(1, 0, 1512345678.0, target, (args,))]
+
+tasks_enforce: PriorityQueue = PriorityQueue()
+# tasks_enforce = [(0, 0, 1512345678.0, target, (args,))]
+
+tasks_log: PriorityQueue = PriorityQueue()
+# tasks_log = [(2, 0, 1512345678.0, target, (args,))]
+
 version: str = "0.2.2"
 
 # Load data from pickle
@@ -589,6 +880,7 @@ user_ids: Dict[int, Dict[str, Dict[Union[int, str], Union[float, int]]]] = {}
 #         }
 #     }
 # }
+# The status are stored as compact UserStatus, which can be used as the dict above
 
 watch_ids: Dict[str, Dict[int, int]] = {
     "ban": {},
@@ -646,6 +938,17 @@ for word_type in regex:
 #     "regex": 0
 # }
 
+# Init the users' status, the scores of the projects are stored in this order
+UserStatus.projects = tuple(default_user_status["score"])
+
+# Init the database
+store: Optional[Database] = None
+store_empty: bool = True
+
+if database:
+    store = Database("data/data.db")
+    store_empty = store.is_empty()
+
 # Load data
 file_list: List[str] = ["admin_ids", "bad_ids", "except_ids", "flooded_ids", "left_group_ids",
                         "trust_ids", "user_ids", "watch_ids",
@@ -653,11 +956,18 @@ file_list: List[str] = ["admin_ids", "bad_ids", "except_ids", "flooded_ids", "le
 file_list += [f"{f}_words" for f in regex]
 
 for file in file_list:
+    # The data are already stored in the database
+    if database and not store_empty and file in journal_list:
+        continue
+
     try:
         try:
             if exists(f"data/{file}") or exists(f"data/.{file}"):
                 with open(f"data/{file}", "rb") as f:
                     locals()[f"{file}"] = pickle.load(f)
+
+                    if file in journal_list:
+                        journal_seq[file] = pickle.load(f) if f.peek(1) else 0
             else:
                 with open(f"data/{file}", "wb") as f:
                     pickle.dump(eval(f"{file}"), f)
@@ -666,10 +976,140 @@ for file in file_list:
 
             with open(f"data/.{file}", "rb") as f:
                 locals()[f"{file}"] = pickle.load(f)
+
+                if file in journal_list:
+                    journal_seq[file] = pickle.load(f) if f.peek(1) else 0
     except Exception as e:
         logger.critical(f"Load data {file} backup error: {e}", exc_info=True)
         raise SystemExit("[DATA CORRUPTION]")
 
+# Replay the journals, the records are applied to the snapshots in order
+for file in journal_list:
+    seq = journal_seq.get(file, 0)
+    journal_count[file] = 0
+
+    for path in [f"data/{file}.journal.old", f"data/{file}.journal"]:
+        if not exists(path):
+            continue
+
+        try:
+            with open(path, "rb") as f:
+                # The journal written without a generation mark is applied
+                generation = seq
+
+                while True:
+                    try:
+                        op, keys, value = pickle.load(f)
+                    except EOFError:
+                        break
+
+                    # The records stay in the journal until the next snapshot
+                    if op == "seq":
+                        generation = value
+                        journal_seq[file] = max(journal_seq.get(file, 0), value)
+                        continue
+
+                    journal_count[file] += 1
+
+                    # The snapshot is newer than the generation of the record
+                    if generation < seq:
+                        continue
+
+                    try:
+                        target = locals()[file]
+
+                        if op in {"add", "discard"}:
+                            for key in keys:
+                                target = target[key]
+
+                            getattr(target, op)(value)
+                        else:
+                            for key in keys[:-1]:
+                                target = target[key]
+
+                            if op == "set":
+                                target[keys[-1]] = value
+                            elif op == "pop":
+                                target.pop(keys[-1], None)
+                    except (KeyError, TypeError) as e:
+                        logger.info(f"Replay journal record {op} {keys} error: {e}")
+        except Exception as e:
+            logger.warning(f"Replay journal {path} error: {e}", exc_info=True)
+
+# Use the database views of the user data
+if database:
+    plain_data = {
+        "bad_ids": bad_ids,
+        "user_ids": user_ids,
+        "watch_ids": watch_ids
+    }
+
+    bad_ids = {
+        "channels": BadSet(store, "channels"),
+        "users": BadSet(store, "users")
+    }
+    user_ids = UserMap(store, default_user_status, database_cache)
+    watch_ids = {
+        "ban": WatchMap(store, "ban"),
+        "delete": WatchMap(store, "delete")
+    }
+
+    # Migrate the pickled data into the empty database, the journals are applied to them already
+    for file in journal_list:
+        if not store_empty:
+            break
+
+        if not load_data(locals()[file], plain_data[file]):
+            raise SystemExit("[DATA MIGRATION]")
+
+        for path in [f"data/{file}.journal.old", f"data/{file}.journal"]:
+            exists(path) and remove(path)
+
+    plain_data = {}
+elif not isinstance(user_ids, UserDict):
+    user_ids = UserDict(user_ids)
+
+# Init the reverse index of the trust lists
+trusted_ids: Dict[int, Set[int]] = {}
+# trusted_ids = {
+#     12345678: {-10012345678}
+# }
+
+for gid in trust_ids:
+    for uid in trust_ids[gid]:
+        trusted_ids.setdefault(uid, set()).add(gid)
+
+# Compile the configs of the groups
+policies: Dict[int, Policy] = {gid: get_policy(configs[gid]) for gid in configs}
+# policies = {
+#     -10012345678: Policy(name=frozenset({"fa"}), plan=("detected", "url", "name"))
+# }
+
+# Init the regex rules registry
+words: Dict[str, Dict[str, Union[float, int]]] = {}
+
+for word_type in regex:
+    words[word_type] = locals()[f"{word_type}_words"]
+
+compiled: Dict[str, Dict[str, Union[int, list, dict, Pattern, None]]] = {}
+# compiled = {
+#     "ad": {
+#         "all": [("regex", re.compile("regex"), "literal")],
+#         "ocr": [("regex", re.compile("regex"), "literal")],
+#         "index": re.compile("(?=(literal))"),
+#         "prefixes": {"literal": {"literal"}},
+#         "indexed": 1
+#     }
+# }
+
+scans: Dict[Tuple[str, ...], Dict[str, Union[dict, Pattern, None]]] = {}
+# scans = {
+#     ("ban", "ad"): {
+#         "index": re.compile("(?=(literal))"),
+#         "prefixes": {"literal": {"literal"}}
+#     }
+# }
+
 # Generate special characters dictionary
 for special in ["spc", "spe"]:
     locals()[f"{special}_dict"]: Dict[str, str] = {}
@@ -689,6 +1129,35 @@ for special in ["spc", "spe"]:
         for k in keys:
             locals()[f"{special}_dict"][k] = value
 
+# Generate the translate table of special characters, spc is applied before spe
+special_table: Dict[int, str] = {}
+
+for k in set(spc_dict) | set(spe_dict):
+    value = spc_dict.get(k, k)
+    value = spe_dict.get(value, value)
+
+    if value != k:
+        special_table[ord(k)] = value
+
+# special_table = {
+#     65313: "A"
+# }
+
+# Generate the pattern of unprintable characters, except line breaks and tabs
+unprintable_ranges: List[List[int]] = []
+
+for point in range(maxunicode + 1):
+    if chr(point).isprintable() or chr(point) in {"\n", "\r", "\t"}:
+        continue
+
+    if unprintable_ranges and unprintable_ranges[-1][1] == point - 1:
+        unprintable_ranges[-1][1] = point
+    else:
+        unprintable_ranges.append([point, point])
+
+unprintable: Pattern = re.compile("[" + "".join(f"\\U{start:08x}-\\U{end:08x}"
+                                                for start, end in unprintable_ranges) + "]")
+
 # Start program
 copyright_text = (f"SCP-079-{sender} v{version}, Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>\n"
                   "Licensed under the terms of the GNU General Public License v3 or later (GPLv3+)\n")
@@ -28,8 +28,9 @@ from ..functions.channel import get_debug_text, share_data
 from ..functions.etc import code, delay, general_link, get_command_context, get_command_type, get_int, get_now
 from ..functions.etc import get_readable_time, lang, thread, mention_id
 from ..functions.file import save
-from ..functions.filters import authorized_group, from_user, is_class_c, test_group
+from ..functions.filters import authorized_group, from_user, get_regex_rules, is_class_c, test_group
 from ..functions.group import delete_message, get_config_text
+from ..functions.ids import update_policy
 from ..functions.telegram import get_group_info, send_message, send_report_message
 
 # Enable logging
@@ -104,7 +105,7 @@ def config(client: Client, message: Message) -> bool:
         text = get_debug_text(client, message.chat)
         text += (f"{lang('admin_group')}{lang('colon')}{code(message.from_user.id)}\n"
                  f"{lang('action')}{lang('colon')}{code(lang('config_create'))}\n")
-        thread(send_message, (client, glovar.debug_channel_id, text))
+        thread(send_message, (client, glovar.debug_channel_id, text), "log")
 
         return True
     except Exception as e:
@@ -207,6 +208,7 @@ def config_directly(client: Client, message: Message) -> bool:
         if success and new_config != glovar.configs[gid]:
             # Save new config
             glovar.configs[gid] = new_config
+            update_policy(gid)
             save("configs")
 
             # Send debug message
@@ -214,7 +216,7 @@ def config_directly(client: Client, message: Message) -> bool:
             debug_text += (f"{lang('admin_group')}{lang('colon')}{code(message.from_user.id)}\n"
                            f"{lang('action')}{lang('colon')}{code(lang('config_change'))}\n"
                            f"{lang('more')}{lang('colon')}{code(f'{command_type} {command_context}')}\n")
-            thread(send_message, (client, glovar.debug_channel_id, debug_text))
+            thread(send_message, (client, glovar.debug_channel_id, debug_text), "log")
 
         text += (f"{lang('action')}{lang('colon')}{code(lang('config_change'))}\n"
                  f"{lang('status')}{lang('colon')}{code(reason)}\n")
@@ -257,6 +259,30 @@ def version(client: Client, message: Message) -> bool:
         get_hash_link = f"https://github.com/scp-079/scp-079-{glovar.sender.lower()}/commit/{git_hash}"
         command_date = get_readable_time(message.date, "%Y/%m/%d %H:%M:%S")
 
+        # Regex index coverage
+        rules_list = [get_regex_rules(word_type) for word_type in glovar.regex]
+        indexed = sum(rules.get("indexed", 0) for rules in rules_list)
+        total = sum(len(rules.get("all", [])) for rules in rules_list)
+
+        # Persistence status
+        save_count = glovar.save_count
+        save_text = f"{save_count['request']} / {save_count['write']}"
+        save_time = f"{save_count['time']:.3f}s / {save_count['max']:.3f}s"
+
+        # Language cache status
+        lang_cache_count = glovar.lang_cache_count
+        lang_cache = f"{lang_cache_count['hit']} / {lang_cache_count['miss']}"
+
+        # Lock status
+        lock_count = glovar.lock_count
+        lock_wait = f"{lock_count['wait'] / (lock_count['count'] or 1):.3f}s / {lock_count['max']:.3f}s"
+
+        # Task status
+        task_count = glovar.task_count
+        task_size = glovar.tasks.qsize() + glovar.tasks_enforce.qsize() + glovar.tasks_log.qsize()
+        task_queue = f"{task_size} / {task_count['done']}"
+        task_wait = f"{task_count['wait'] / (task_count['done'] or 1):.3f}s / {task_count['max']:.3f}s"
+
         # Generate the text
         text = (f"{lang('admin')}{lang('colon')}{mention_id(aid)}\n\n"
                 f"{lang('project')}{lang('colon')}{code(glovar.sender)}\n"
@@ -264,7 +290,14 @@ def version(client: Client, message: Message) -> bool:
                 f"{lang('本地修改')}{lang('colon')}{code(git_change)}\n"
                 f"{lang('哈希值')}{lang('colon')}{general_link(git_hash, get_hash_link)}\n"
                 f"{lang('提交时间')}{lang('colon')}{code(git_date)}\n"
-                f"{lang('命令发送时间')}{lang('colon')}{code(command_date)}\n")
+                f"{lang('命令发送时间')}{lang('colon')}{code(command_date)}\n"
+                f"{lang('regex_index')}{lang('colon')}{code(f'{indexed} / {total}')}\n"
+                f"{lang('save_count')}{lang('colon')}{code(save_text)}\n"
+                f"{lang('save_time')}{lang('colon')}{code(save_time)}\n"
+                f"{lang('lang_cache')}{lang('colon')}{code(lang_cache)}\n"
+                f"{lang('lock_wait')}{lang('colon')}{code(lock_wait)}\n"
+                f"{lang('task_queue')}{lang('colon')}{code(task_queue)}\n"
+                f"{lang('task_wait')}{lang('colon')}{code(task_wait)}\n")
 
         # Send the report message
         result = send_message(client, cid, text, mid)
@@ -17,34 +17,76 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 from pyrogram import Client, Filters, Message
 
 from .. import glovar
 from ..functions.channel import get_content, get_debug_text
-from ..functions.etc import code, delay, general_link, get_filename, get_forward_name, get_full_name, get_now, get_text
-from ..functions.etc import lang, mention_id, t2t, thread
-from ..functions.file import save
+from ..functions.etc import code, delay, general_link, get_filename, get_forward_name, get_from_name, get_full_name
+from ..functions.etc import get_now, get_text, lang, lock_chat, mention_id, thread
+from ..functions.file import journal, save
 from ..functions.filters import aio, authorized_group, class_c, class_d, class_e, declared_message, exchange_channel
-from ..functions.filters import from_user, hide_channel, is_ban_text, is_class_d_user, is_declared_message
-from ..functions.filters import is_detected_url, is_in_config, is_nm_text, is_not_allowed, is_regex_text
+from ..functions.filters import count_regex_hits, from_user, get_regex_first, get_regex_scan, hide_channel
+from ..functions.filters import is_ban_text, is_class_d_user, is_declared_message, is_detected_url, is_in_config
+from ..functions.filters import is_nm_text, is_not_allowed, is_regex_hit, is_regex_text
 from ..functions.filters import new_group, test_group
 from ..functions.group import leave_group
-from ..functions.ids import init_group_id, init_user_id
+from ..functions.ids import init_group_id, init_user_id, update_trust_ids
 from ..functions.receive import receive_add_bad, receive_add_except, receive_captcha_flood, receive_captcha_kicked_user
 from ..functions.receive import receive_captcha_kicked_users, receive_clear_data, receive_config_commit
 from ..functions.receive import receive_config_reply, receive_config_show, receive_declared_message, receive_preview
-from ..functions.receive import receive_leave_approve, receive_refresh, receive_regex, receive_remove_bad
+from ..functions.receive import receive_leave_approve, receive_refresh, receive_regex, receive_regex_count
+from ..functions.receive import receive_remove_bad
 from ..functions.receive import receive_remove_except, receive_remove_score, receive_remove_watch, receive_rollback
 from ..functions.receive import receive_text_data, receive_user_score, receive_watch_user
 from ..functions.telegram import get_admins, get_user_bio, send_message
 from ..functions.tests import lang_test
-from ..functions.timers import backup_files, send_count
+from ..functions.timers import backup_files
 from ..functions.user import terminate_user
 
 # Enable logging
 logger = logging.getLogger(__name__)
 
+# The handlers of the data in exchange channel
+# data_handlers = {
+#     (receiver, sender, action, type): (target, argument names, mode)
+# }
+# The type None matches all the types, the mode is one of "now", "thread" and "delay"
+# The actions that replace the data must be "now", so they stay in order under the receive lock
+data_handlers: Dict[Tuple[str, str, str, Optional[str]], Tuple[Callable, List[str], str]] = {
+    (glovar.sender, "CAPTCHA", "flood", "status"): (receive_captcha_flood, ["data"], "now"),
+    (glovar.sender, "CAPTCHA", "update", "score"): (receive_user_score, ["sender", "data"], "now"),
+    (glovar.sender, "CONFIG", "config", "commit"): (receive_config_commit, ["data"], "now"),
+    (glovar.sender, "CONFIG", "config", "reply"): (receive_config_reply, ["client", "data"], "now"),
+    (glovar.sender, "MANAGE", "add", "bad"): (receive_add_bad, ["sender", "data"], "now"),
+    (glovar.sender, "MANAGE", "add", "except"): (receive_add_except, ["client", "data"], "now"),
+    (glovar.sender, "MANAGE", "backup", "now"): (backup_files, ["client"], "thread"),
+    (glovar.sender, "MANAGE", "backup", "rollback"): (receive_rollback, ["client", "message", "data"], "now"),
+    (glovar.sender, "MANAGE", "clear", None): (receive_clear_data, ["client", "type", "data"], "now"),
+    (glovar.sender, "MANAGE", "config", "show"): (receive_config_show, ["client", "data"], "thread"),
+    (glovar.sender, "MANAGE", "leave", "approve"): (receive_leave_approve, ["client", "data"], "thread"),
+    (glovar.sender, "MANAGE", "remove", "bad"): (receive_remove_bad, ["data"], "now"),
+    (glovar.sender, "MANAGE", "remove", "except"): (receive_remove_except, ["client", "data"], "now"),
+    (glovar.sender, "MANAGE", "remove", "score"): (receive_remove_score, ["data"], "now"),
+    (glovar.sender, "MANAGE", "remove", "watch"): (receive_remove_watch, ["data"], "now"),
+    (glovar.sender, "MANAGE", "update", "refresh"): (receive_refresh, ["client", "data"], "now"),
+    (glovar.sender, "REGEX", "regex", "count"): (receive_regex_count, ["client", "data"], "thread"),
+    (glovar.sender, "REGEX", "regex", "update"): (receive_regex, ["client", "message", "data"], "now"),
+    (glovar.sender, "USER", "add", "bad"): (receive_add_bad, ["sender", "data"], "now"),
+    (glovar.sender, "USER", "update", "preview"): (receive_preview, ["client", "message", "data"], "delay"),
+    (glovar.sender, "WARN", "update", "score"): (receive_user_score, ["sender", "data"], "now"),
+    (glovar.sender, "WATCH", "add", "watch"): (receive_watch_user, ["data"], "now"),
+    ("USER", "CAPTCHA", "flood", "delete"): (receive_captcha_kicked_users, ["client", "message", "data"], "thread"),
+    ("USER", "CAPTCHA", "help", "delete"): (receive_captcha_kicked_user, ["data"], "now")
+}
+
+for project in ["CLEAN", "LANG", "LONG", "NOFLOOD", "NOPORN", "NOSPAM", "RECHECK"]:
+    data_handlers[(glovar.sender, project, "add", "bad")] = (receive_add_bad, ["sender", "data"], "now")
+    data_handlers[(glovar.sender, project, "add", "watch")] = (receive_watch_user, ["data"], "now")
+    data_handlers[(glovar.sender, project, "update", "declare")] = (receive_declared_message, ["data"], "now")
+    data_handlers[(glovar.sender, project, "update", "score")] = (receive_user_score, ["sender", "data"], "now")
+
 
 @Client.on_message(Filters.incoming & Filters.group & ~Filters.new_chat_members
                    & ~test_group & authorized_group
@@ -54,11 +96,7 @@ def check(client: Client, message: Message) -> bool:
     # Check the messages sent from groups
 
     has_text = bool(message and (message.text or message.caption))
-
-    if has_text:
-        glovar.locks["text"].acquire()
-    else:
-        glovar.locks["message"].acquire()
+    lock = lock_chat((has_text and "text") or "message", message.chat.id)
 
     try:
         # Check declare status
@@ -73,35 +111,38 @@ def check(client: Client, message: Message) -> bool:
             forward_name = get_forward_name(message)
 
             if forward_name and forward_name not in glovar.except_ids["long"]:
-                if is_nm_text(t2t(forward_name, True, True)):
+                if is_nm_text(get_forward_name(message, True, True)):
                     return False
 
             # Check the user's name:
-            name = get_full_name(message.from_user)
+            name = get_from_name(message)
 
             if name and name not in glovar.except_ids["long"]:
-                if is_nm_text(t2t(name, True, True)):
+                if is_nm_text(get_from_name(message, True, True)):
                     return False
 
             # Check the text
             message_text = get_text(message, True, True)
+            scan = get_regex_scan(glovar.ban_types + ["del"], message_text)
 
-            if is_ban_text(message_text, False):
+            if is_ban_text(message_text, False, None, scan):
                 return False
 
-            if is_regex_text("del", message_text):
+            if is_regex_hit(scan, "del"):
+                count_regex_hits(scan, ["del"])
                 return False
 
             # File name
             filename = get_filename(message, True, True)
+            scan = get_regex_scan(glovar.ban_types + ["fil", "del"], filename)
 
-            if is_ban_text(filename, False):
+            if is_ban_text(filename, False, None, scan):
                 return False
 
-            if is_regex_text("fil", filename):
-                return False
+            hit = get_regex_first(scan, ["fil", "del"])
 
-            if is_regex_text("del", filename):
+            if hit:
+                count_regex_hits(scan, [hit])
                 return False
 
             # Check sticker
@@ -132,10 +173,7 @@ def check(client: Client, message: Message) -> bool:
     except Exception as e:
         logger.warning(f"Check error: {e}", exc_info=True)
     finally:
-        if has_text:
-            glovar.locks["text"].release()
-        else:
-            glovar.locks["message"].release()
+        lock.release()
 
     return False
 
@@ -146,7 +184,8 @@ def check(client: Client, message: Message) -> bool:
                    & ~declared_message)
 def check_join(client: Client, message: Message) -> bool:
     # Check new joined user
-    glovar.locks["message"].acquire()
+    lock = lock_chat("message", message.chat.id)
+
     try:
         # Basic data
         gid = message.chat.id
@@ -188,13 +227,13 @@ def check_join(client: Client, message: Message) -> bool:
 
             # Update the user's join status
             glovar.user_ids[uid]["join"][gid] = now
-            save("user_ids")
+            journal("user_ids", "set", (uid, "join", gid), now)
 
         return True
     except Exception as e:
         logger.warning(f"Check join error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        lock.release()
 
     return False
 
@@ -235,7 +274,7 @@ def exchange_emergency(client: Client, message: Message) -> bool:
         text = (f"{lang('project')}{lang('colon')}{project_text}\n"
                 f"{lang('action')}{lang('colon')}{code(lang('transfer_channel'))}\n"
                 f"{lang('emergency_channel')}{lang('colon')}{code(hide_text)}\n")
-        thread(send_message, (client, glovar.debug_channel_id, text))
+        thread(send_message, (client, glovar.debug_channel_id, text), "log")
 
         return True
     except Exception as e:
@@ -282,15 +321,14 @@ def init_group(client: Client, message: Message) -> bool:
                 save("admin_ids")
 
                 # Trust list
-                glovar.trust_ids[gid] = {admin.user.id for admin in admin_members
-                                         if ((not admin.user.is_bot and not admin.user.is_deleted)
-                                             or admin.user.id in glovar.bot_ids)}
-                save("trust_ids")
+                update_trust_ids(gid, {admin.user.id for admin in admin_members
+                                       if ((not admin.user.is_bot and not admin.user.is_deleted)
+                                           or admin.user.id in glovar.bot_ids)})
 
                 # Text
                 text += f"{lang('status')}{lang('colon')}{code(lang('status_joined'))}\n"
             else:
-                thread(leave_group, (client, gid))
+                thread(leave_group, (client, gid), "enforce")
                 text += (f"{lang('status')}{lang('colon')}{code(lang('status_left'))}\n"
                          f"{lang('reason')}{lang('colon')}{code(lang('reason_admin'))}\n")
         else:
@@ -309,7 +347,7 @@ def init_group(client: Client, message: Message) -> bool:
             text += f"{lang('inviter')}{lang('colon')}{code(inviter.id)}\n"
 
         # Send debug message
-        thread(send_message, (client, glovar.debug_channel_id, text))
+        thread(send_message, (client, glovar.debug_channel_id, text), "log")
 
         return True
     except Exception as e:
@@ -325,226 +363,76 @@ def process_data(client: Client, message: Message) -> bool:
     # Process the data in exchange channel
     glovar.locks["receive"].acquire()
     try:
+        # Skip the data for other bots before parsing
+        text = get_text(message)
+
+        if f'"{glovar.sender}"' not in text and '"USER"' not in text:
+            return True
+
         data = receive_text_data(message)
 
         if not data:
             return True
 
         sender = data["from"]
-        receivers = data["to"]
-        action = data["action"]
-        action_type = data["type"]
-        data = data["data"]
 
-        # This will look awkward,
-        # seems like it can be simplified,
-        # but this is to ensure that the permissions are clear,
-        # so it is intentionally written like this
-        if glovar.sender in receivers:
+        # Unpack the batched data, the single data is still accepted
+        if data["action"] == "batch":
+            events = data["data"]
+        else:
+            events = [[data["to"], data["action"], data["type"], data["data"]]]
 
-            if sender == "CAPTCHA":
-
-                if action == "flood":
-                    if action_type == "status":
-                        receive_captcha_flood(data)
-
-                elif action == "update":
-                    if action_type == "score":
-                        receive_user_score(sender, data)
-
-            elif sender == "CLEAN":
-
-                if action == "add":
-                    if action_type == "bad":
-                        receive_add_bad(sender, data)
-                    elif action_type == "watch":
-                        receive_watch_user(data)
-
-                elif action == "update":
-                    if action_type == "declare":
-                        receive_declared_message(data)
-                    elif action_type == "score":
-                        receive_user_score(sender, data)
-
-            elif sender == "CONFIG":
-
-                if action == "config":
-                    if action_type == "commit":
-                        receive_config_commit(data)
-                    elif action_type == "reply":
-                        receive_config_reply(client, data)
-
-            elif sender == "LANG":
-
-                if action == "add":
-                    if action_type == "bad":
-                        receive_add_bad(sender, data)
-                    elif action_type == "watch":
-                        receive_watch_user(data)
-
-                elif action == "update":
-                    if action_type == "declare":
-                        receive_declared_message(data)
-                    elif action_type == "score":
-                        receive_user_score(sender, data)
-
-            elif sender == "LONG":
-
-                if action == "add":
-                    if action_type == "bad":
-                        receive_add_bad(sender, data)
-                    elif action_type == "watch":
-                        receive_watch_user(data)
-
-                elif action == "update":
-                    if action_type == "declare":
-                        receive_declared_message(data)
-                    elif action_type == "score":
-                        receive_user_score(sender, data)
-
-            elif sender == "MANAGE":
-
-                if action == "add":
-                    if action_type == "bad":
-                        receive_add_bad(sender, data)
-                    elif action_type == "except":
-                        receive_add_except(client, data)
-
-                elif action == "backup":
-                    if action_type == "now":
-                        thread(backup_files, (client,))
-                    elif action_type == "rollback":
-                        receive_rollback(client, message, data)
-
-                elif action == "clear":
-                    receive_clear_data(client, action_type, data)
-
-                elif action == "config":
-                    if action_type == "show":
-                        receive_config_show(client, data)
-
-                elif action == "leave":
-                    if action_type == "approve":
-                        receive_leave_approve(client, data)
-
-                elif action == "remove":
-                    if action_type == "bad":
-                        receive_remove_bad(data)
-                    elif action_type == "except":
-                        receive_remove_except(client, data)
-                    elif action_type == "score":
-                        receive_remove_score(data)
-                    elif action_type == "watch":
-                        receive_remove_watch(data)
-
-                elif action == "update":
-                    if action_type == "refresh":
-                        receive_refresh(client, data)
-
-            elif sender == "NOFLOOD":
-
-                if action == "add":
-                    if action_type == "bad":
-                        receive_add_bad(sender, data)
-                    elif action_type == "watch":
-                        receive_watch_user(data)
-
-                elif action == "update":
-                    if action_type == "declare":
-                        receive_declared_message(data)
-                    elif action_type == "score":
-                        receive_user_score(sender, data)
-
-            elif sender == "NOPORN":
-
-                if action == "add":
-                    if action_type == "bad":
-                        receive_add_bad(sender, data)
-                    elif action_type == "watch":
-                        receive_watch_user(data)
-
-                elif action == "update":
-                    if action_type == "declare":
-                        receive_declared_message(data)
-                    elif action_type == "score":
-                        receive_user_score(sender, data)
-
-            elif sender == "NOSPAM":
-
-                if action == "add":
-                    if action_type == "bad":
-                        receive_add_bad(sender, data)
-                    elif action_type == "watch":
-                        receive_watch_user(data)
-
-                elif action == "update":
-                    if action_type == "declare":
-                        receive_declared_message(data)
-                    elif action_type == "score":
-                        receive_user_score(sender, data)
-
-            elif sender == "RECHECK":
-
-                if action == "add":
-                    if action_type == "bad":
-                        receive_add_bad(sender, data)
-                    elif action_type == "watch":
-                        receive_watch_user(data)
-
-                elif action == "update":
-                    if action_type == "declare":
-                        receive_declared_message(data)
-                    elif action_type == "score":
-                        receive_user_score(sender, data)
-
-            elif sender == "REGEX":
-
-                if action == "regex":
-                    if action_type == "update":
-                        receive_regex(client, message, data)
-                    elif action_type == "count":
-                        if data == "ask":
-                            send_count(client)
-
-            elif sender == "USER":
-
-                if action == "add":
-                    if action_type == "bad":
-                        receive_add_bad(sender, data)
-
-                elif action == "update":
-                    if action_type == "preview":
-                        delay(10, receive_preview, [client, message, data])
-
-            elif sender == "WARN":
-
-                if action == "update":
-                    if action_type == "score":
-                        receive_user_score(sender, data)
-
-            elif sender == "WATCH":
-
-                if action == "add":
-                    if action_type == "watch":
-                        receive_watch_user(data)
+        for receivers, action, action_type, the_data in events:
+            process_event(client, message, sender, receivers, action, action_type, the_data)
 
+        return True
+    except Exception as e:
+        logger.warning(f"Process data error: {e}", exc_info=True)
+    finally:
+        glovar.locks["receive"].release()
+
+    return False
+
+
+def process_event(client: Client, message: Message, sender: str, receivers: List[str], action: str,
+                  action_type: str, data: Union[bool, dict, int, list, str]) -> bool:
+    # Process a single data in exchange channel
+    try:
+        if glovar.sender in receivers:
+            receiver = glovar.sender
         elif "USER" in receivers:
+            receiver = "USER"
+        else:
+            return True
 
-            if sender == "CAPTCHA":
+        # The table makes the permissions clear, every allowed (sender, action, type) is listed
+        handler = (data_handlers.get((receiver, sender, action, action_type))
+                   or data_handlers.get((receiver, sender, action, None)))
 
-                if action == "flood":
-                    if action_type == "delete":
-                        receive_captcha_kicked_users(client, message, data)
+        if not handler:
+            return True
 
-                elif action == "help":
-                    if action_type == "delete":
-                        receive_captcha_kicked_user(data)
+        target, names, mode = handler
+        values = {
+            "client": client,
+            "message": message,
+            "sender": sender,
+            "type": action_type,
+            "data": data
+        }
+        args = tuple(values[name] for name in names)
+
+        # The slow actions do not block the others
+        if mode == "delay":
+            delay(10, target, list(args))
+        elif mode == "thread":
+            thread(target, args)
+        else:
+            target(*args)
 
         return True
     except Exception as e:
-        logger.warning(f"Process data error: {e}", exc_info=True)
-    finally:
-        glovar.locks["receive"].release()
+        logger.warning(f"Process event error: {e}", exc_info=True)
 
     return False
 